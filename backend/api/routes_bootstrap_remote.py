@@ -5,6 +5,7 @@ from typing import List, Dict, Any
 
 from core.config import settings
 from core.logging import get_logger
+from ml.index_versions import active_dir
 from services.index_bootstrap import build_index
 
 router = APIRouter(prefix="/bootstrap", tags=["bootstrap"])
@@ -35,8 +36,8 @@ def bootstrap_from_remote():
     return BootstrapOut(
         total_seen=total_seen,
         kept_indexed=kept,
-        index_path=str(settings.faiss_index_path),
-        meta_path=str(settings.faiss_meta_path),
+        index_path=str(active_dir(settings.index_dir) / "index.faiss"),
+        meta_path=str(active_dir(settings.index_dir) / "meta.jsonl"),
         sources=[
             {
                 "name": src.name,
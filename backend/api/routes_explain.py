@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from core.db import init_db_if_possible
 from services.lightweight_explain import update_everything_with_text
 from services.lightweight_search import add_review_text_for_search
+from services.vector_ingest import enqueue_for_indexing
 
 router = APIRouter()
 
@@ -21,5 +22,7 @@ def explain_endpoint(body: ExplainRequest):
 
     # add to search memory
     add_review_text_for_search(body.text)
+    # and, in the background, to the semantic index
+    enqueue_for_indexing(body.text)
 
     return resp
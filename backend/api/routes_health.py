@@ -1,8 +1,29 @@
 # backend/api/routes_health.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+
+from core.config import settings
+from ml.sentiment_model import is_ready, model_status, warmup
 
 router = APIRouter()
 
 @router.get("/health")
-def health():
-    return {"ok": True}
+def health(deep: bool = False):
+    """
+    Liveness: answers without touching the models.
+    ?deep=1 loads + warms them (if not already) and reports per-model
+    load time, availability and errors.
+    """
+    if not deep:
+        return {"ok": True}
+    return {"ok": True, "models": warmup()}
+
+@router.get("/ready")
+def ready(response: Response):
+    """
+    Readiness for the load balancer: 503 until the startup warmup has
+    loaded the sentiment + spaCy models (always ready with the warmup off).
+    """
+    status = model_status()
+    if settings.model_warmup_on_startup and not is_ready():
+        response.status_code = 503
+    return status
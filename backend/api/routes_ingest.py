@@ -6,6 +6,7 @@ from typing import List
 from core.db import init_db_if_possible
 from services.lightweight_explain import update_everything_with_text
 from services.lightweight_search import add_review_text_for_search
+from services.vector_ingest import enqueue_for_indexing
 
 router = APIRouter()
 
@@ -26,6 +27,8 @@ def ingest_jsonl(body: IngestRequest):
 
         # make searchable
         add_review_text_for_search(text_clean)
+        # embedded + added to FAISS in the background
+        enqueue_for_indexing(text_clean)
 
         processed += 1
 
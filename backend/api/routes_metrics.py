@@ -1,8 +1,28 @@
 # backend/api/routes_metrics.py
 from fastapi import APIRouter
+from services.state_store import GLOBAL_REVIEWS
+from services.vector_ingest import get_vector_ingestor, vector_ingest_available
 
 router = APIRouter()
 
+@router.get("/metrics/review-store")
+def review_store_stats():
+    """
+    Size of the in-memory review store, for sizing instances:
+    resident rows/bytes in RAM (row dicts + lexical index state) vs rows
+    spilled to the on-disk segment.
+    """
+    return GLOBAL_REVIEWS.stats()
+
+@router.get("/metrics/vector-ingest")
+def vector_ingest_stats():
+    """
+    Background embedder: reviews queued / indexed / dropped, batches run,
+    index checkpoints written. "enabled" is false when it's switched off or
+    faiss / sentence-transformers aren't installed (lite image).
+    """
+    return {"enabled": vector_ingest_available(), **get_vector_ingestor().stats()}
+
 @router.get("/metrics-overview")
 def metrics_overview():
     return {
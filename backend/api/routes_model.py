@@ -1,9 +1,13 @@
 # backend/api/routes_model.py
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 
-from ml.sentiment_model import predict_sentiment, aspect_breakdown
+from core.config import settings
+from ml.inference_scheduler import InferenceScheduler
+from ml.sentiment_model import predict_sentiment_many, aspect_breakdown_many, inference_cache_stats
+from ml.spacy_service import get_spacy_service
 
 router = APIRouter()
 
@@ -20,37 +24,82 @@ class PredictResponse(BaseModel):
 class PredictRequest(BaseModel):
     text: str
 
-@router.post("/model/predict", response_model=PredictResponse)
-def model_predict(req: PredictRequest):
+def _overall_sentiment(label: str) -> str:
+    label = label.lower()
+    if "pos" in label:
+        return "positive"
+    if "neg" in label:
+        return "negative"
+    return "neutral"
+
+def _predict_batch(texts: List[str]) -> List[PredictResponse]:
     """
-    Sentiment + ABSA summary.
+    One padded sentiment pass + one aspect pass for a batch of requests.
+    An exception fails every request in the batch.
     """
     try:
-        overall = predict_sentiment(req.text)
+        overall = predict_sentiment_many(texts)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"sentiment failed: {e}")
 
-    overall_label = overall["label"].lower()
-    if "pos" in overall_label:
-        overall_sent = "positive"
-    elif "neg" in overall_label:
-        overall_sent = "negative"
-    else:
-        overall_sent = "neutral"
-
     # aspect-level
-    aspects_raw = aspect_breakdown(req.text)
-    aspects_typed = [
-        AspectOut(
-            aspect=a["aspect"],
-            sentiment=a["sentiment"],
-            score=float(a["score"]),
+    aspects_raw = aspect_breakdown_many(texts)
+
+    return [
+        PredictResponse(
+            sentiment=_overall_sentiment(o["label"]),
+            score=float(o["score"]),
+            aspects=[
+                AspectOut(aspect=a["aspect"], sentiment=a["sentiment"], score=float(a["score"]))
+                for a in aspects
+            ],
         )
-        for a in aspects_raw
+        for o, aspects in zip(overall, aspects_raw)
     ]
 
-    return PredictResponse(
-        sentiment=overall_sent,
-        score=float(overall["score"]),
-        aspects=aspects_typed,
+# concurrent /model/predict calls share one batch; None = one batch per request
+_scheduler: Optional[InferenceScheduler] = None
+if settings.model_batch_enabled:
+    _scheduler = InferenceScheduler(
+        _predict_batch,
+        max_batch=settings.model_batch_max,
+        max_delay_ms=settings.model_batch_max_delay_ms,
+        name="model-predict-scheduler",
     )
+
+@router.post("/model/predict", response_model=PredictResponse)
+async def model_predict(req: PredictRequest):
+    """
+    Sentiment + ABSA summary.
+    """
+    if _scheduler is not None:
+        return await _scheduler.submit(req.text)
+    return (await run_in_threadpool(_predict_batch, [req.text]))[0]
+
+@router.get("/metrics/model-batching")
+def model_batching_metrics():
+    """
+    /model/predict scheduler: queue depth, batch-size histogram, queue wait
+    (ms) before each request's batch started.
+    """
+    if _scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, **_scheduler.stats()}
+
+async def shutdown_model_scheduler():
+    if _scheduler is not None:
+        await _scheduler.close()
+
+@router.get("/metrics/inference-cache")
+def inference_cache_metrics():
+    """
+    predict_sentiment / aspect_breakdown LRU: entries, hits, misses, evictions.
+    """
+    return inference_cache_stats()
+
+@router.get("/metrics/spacy")
+def spacy_metrics():
+    """
+    Shared spaCy pipelines: components loaded, load time, docs parsed, docs/sec.
+    """
+    return get_spacy_service().stats()
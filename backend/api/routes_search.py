@@ -1,14 +1,96 @@
 # backend/api/routes_search.py
-from fastapi import APIRouter
+import json
+import time
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from services.lightweight_search import search_similar
+from typing import List, Optional, Union
+from core.config import settings
+from services.hybrid_search import hybrid_search, hybrid_search_batch, SemanticUnavailable
 
 router = APIRouter()
 
-class SearchRequest(BaseModel):
+class FilterFields(BaseModel):
+    # metadata filters (semantic side only; hybrid / no mode become semantic when set)
+    domain: Optional[Union[str, List[str]]] = None
+    source: Optional[Union[str, List[str]]] = None
+    product: Optional[Union[str, List[str]]] = None
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+
+    def filters(self):
+        return {
+            "domain": self.domain,
+            "source": self.source,
+            "product": self.product,
+            "min_rating": self.min_rating,
+            "max_rating": self.max_rating,
+        }
+
+class SearchRequest(FilterFields):
+    query: str
+    k: int = 5
+    # "lexical" | "semantic" | "hybrid" (lexical + FAISS, rank-fused; score is
+    # then an RRF value). Unset: lexical, or semantic when filters are given
+    mode: Optional[str] = None
+    # lexical ranking: "bm25" (default) or "jaccard" to compare against the old overlap score
+    ranking: str = "bm25"
+
+class BatchQuery(FilterFields):
     query: str
+    k: int = 5
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery]
+    mode: Optional[str] = None
+    ranking: str = "bm25"
+    # true -> application/x-ndjson, one {"index", "hits", "mode"} line per query
+    stream: bool = False
 
 @router.post("/search")
 def search_endpoint(body: SearchRequest):
-    hits = search_similar(body.query, k=5)
-    return {"hits": hits}
+    try:
+        return hybrid_search(body.query, k=body.k, mode=body.mode, ranking=body.ranking, filters=body.filters())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SemanticUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"semantic index unavailable: {e}")
+
+@router.post("/search/batch")
+def search_batch_endpoint(body: BatchSearchRequest):
+    """
+    Many /search lookups in one call: semantic queries are embedded together
+    and searched with one FAISS call per chunk (per distinct filter).
+    Results come back in request order.
+    """
+    if len(body.queries) > settings.search_batch_max:
+        raise HTTPException(status_code=400, detail=f"at most {settings.search_batch_max} queries per batch")
+    items = [{"query": q.query, "k": q.k, "filters": q.filters()} for q in body.queries]
+    t0 = time.perf_counter()
+    try:
+        # validates every item (and semantic availability) before yielding
+        results = hybrid_search_batch(
+            items, mode=body.mode, ranking=body.ranking, chunk_size=settings.search_batch_chunk,
+        )
+        first = next(results, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SemanticUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"semantic index unavailable: {e}")
+
+    if body.stream:
+        def lines():
+            if first is None:
+                return
+            yield json.dumps({"index": 0, **first}) + "\n"
+            for i, res in enumerate(results, start=1):
+                yield json.dumps({"index": i, **res}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    out = [] if first is None else [first, *results]
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    return {
+        "results": out,
+        "timings_ms": {"total_ms": round(total_ms, 3), "per_query_ms": round(total_ms / max(1, len(out)), 3)},
+    }
@@ -1,8 +1,12 @@
 # backend/app.py
+import threading
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.config import settings
+from ml.sentiment_model import warmup
+from services.vector_ingest import shutdown_vector_ingest
 
 from api.routes_health import router as health_router
 from api.routes_explain import router as explain_router
@@ -10,6 +14,7 @@ from api.routes_search import router as search_router
 from api.routes_ingest import router as ingest_router
 from api.routes_metrics import router as metrics_router
 from api.routes_eda import router as eda_router
+from api.routes_model import router as model_router, shutdown_model_scheduler
 
 app = FastAPI(
     title="CDRI Hybrid (Render + Neon fallback)",
@@ -37,6 +42,23 @@ app.include_router(search_router)
 app.include_router(ingest_router)
 app.include_router(metrics_router)
 app.include_router(eda_router)
+app.include_router(model_router)
+
+@app.on_event("startup")
+def warm_models():
+    # in the background: /health answers right away, /ready flips to 200
+    # once the sentiment + spaCy models are loaded
+    if settings.model_warmup_on_startup:
+        threading.Thread(target=warmup, name="model-warmup", daemon=True).start()
+
+@app.on_event("shutdown")
+def flush_vector_ingest():
+    # embed what's still queued and checkpoint the index before exiting
+    shutdown_vector_ingest()
+
+@app.on_event("shutdown")
+async def stop_model_scheduler():
+    await shutdown_model_scheduler()
 
 @app.get("/")
 def root():
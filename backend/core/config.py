@@ -1,9 +1,114 @@
 # backend/core/config.py
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Literal
 from pydantic_settings import BaseSettings
 
+
+@dataclass
+class RemoteSource:
+    """
+    One public review dump used for cold-start indexing
+    (services/public_data.PublicDataLoader).
+    fmt: "jsonl" | "jsonl_gz" | "csv" | "tsv"
+    rating_scale: top of the source's rating scale (drugs.com 10, Amazon 5)
+    """
+    name: str
+    url: str
+    fmt: str = "jsonl"
+    domain: str | None = None
+    rating_scale: float = 5.0
+
 class Settings(BaseSettings):
     allowed_origins: str = "*"
     database_url: str | None = None
+
+    # in-memory review store (services/state_store.py)
+    # RAM budget for resident review rows; older rows spill to disk past it.
+    # 0 = unbounded (keep everything in RAM).
+    review_store_max_bytes: int = 64 * 1024 * 1024
+    review_store_spill_dir: Path = Path("/data/review_store")
+
+    # semantic search (FAISS + sentence-transformers)
+    # builds go to index_dir/versions/<v>, index_dir/current points at the
+    # served one (ml/index_versions.py)
+    index_dir: Path = Path("/data/index")
+    # how often a running SemanticIndex checks for a newly published version (0 = never)
+    index_reload_interval_s: float = 5.0
+    # retired versions are deleted after this long, keeping the newest index_keep_versions
+    index_gc_grace_s: float = 600.0
+    index_keep_versions: int = 1
+    emb_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # FAISS index type for builds (ml/ann_index.py):
+    # "flat" | "ivf" | "hnsw" | compressed "fp16" | "sq8" | "ivfpq"
+    index_type: str = "flat"
+    index_nlist: int = 256
+    index_hnsw_m: int = 32
+    index_pq_m: int = 48
+    index_pq_nbits: int = 8
+    # default search-time knobs (ignored by index types they don't apply to)
+    index_nprobe: int = 16
+    index_ef_search: int = 64
+    # build-time embedding processes (ml/parallel_embed.py), each with its own
+    # model copy; 1 = embed in the build process. 0 threads = cores / workers
+    index_build_workers: int = 1
+    index_build_threads_per_worker: int = 0
+
+    # content-addressed embedding cache reused across index rebuilds
+    # (ml/embed_cache.py): sha1(model + text) -> vector, one subdir per builder
+    embed_cache_enabled: bool = True
+    embed_cache_dir: Path = Path("/data/embed_cache")
+
+    # micro-batching of concurrent semantic queries (ml/query_batcher.py):
+    # queries arriving within query_batch_wait_ms share one encode + search
+    query_batch_enabled: bool = True
+    query_batch_max: int = 32
+    query_batch_wait_ms: float = 3.0
+    # POST /search/batch: max queries per request, and how many are embedded
+    # + searched together (bounds memory on huge batches)
+    search_batch_max: int = 10000
+    search_batch_chunk: int = 256
+
+    # load + warm the sentiment / spaCy models in the background at startup
+    # (GET /ready is 503 until done); off = load on first use
+    model_warmup_on_startup: bool = True
+    # dynamic batching of concurrent POST /model/predict calls
+    # (ml/inference_scheduler.py): requests arriving within
+    # model_batch_max_delay_ms share one padded sentiment + aspect batch
+    model_batch_enabled: bool = True
+    model_batch_max: int = 32
+    model_batch_max_delay_ms: float = 5.0
+
+    # /explain-request token attributions (services/token_attribution.py):
+    # "lexicon" (word list, no model) | "token" | "occlusion" (batched model
+    # passes, at most explain_attribution_max_passes per request); an unknown
+    # mode fails at startup rather than on every request
+    explain_attribution_mode: Literal["lexicon", "token", "occlusion"] = "lexicon"
+    explain_attribution_batch_size: int = 32
+    explain_attribution_max_passes: int = 4
+
+    # background embedder feeding /ingest/jsonl + /explain-request reviews
+    # into the FAISS index (services/vector_ingest.py); skipped automatically
+    # when faiss / sentence-transformers aren't installed (requirements-lite)
+    vector_ingest_enabled: bool = True
+    vector_ingest_batch_size: int = 64
+    vector_ingest_max_wait_ms: int = 500
+    # how often the in-memory index is written back over index.faiss
+    vector_ingest_checkpoint_s: float = 30.0
+    vector_ingest_queue_max: int = 10000
+
+    # concurrent source streaming in PublicDataLoader (1 = one source after another)
+    bootstrap_workers: int = 4
+    # rows buffered between the source workers and build_index
+    bootstrap_queue_size: int = 1024
+
+    # sources streamed by build_index (defaults = scripts/prepare_min_slices.py output)
+    bootstrap_sources: List[RemoteSource] = [
+        RemoteSource(name="drugscom", url="/data/prepared/drugscom_min.jsonl", fmt="jsonl", domain="health", rating_scale=10.0),
+        RemoteSource(name="amazon", url="/data/prepared/amazon_electronics_min.jsonl", fmt="jsonl", domain="electronics"),
+    ]
+
+    # paths inside the published index version
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -1,23 +1,34 @@
-import spacy
+from typing import Any, Dict, List
+
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import torch
 
+from .spacy_service import NER, get_spacy_service
+
 class ABSA:
     def __init__(self, base="distilbert-base-uncased"):
-        self.nlp = spacy.load("en_core_web_sm")
+        # NER-only spaCy pipeline, shared (ml/spacy_service.py)
+        self.spacy = get_spacy_service()
+        self.nlp = self.spacy.nlp(NER)
         self.tok = AutoTokenizer.from_pretrained(base)
         self.cls = AutoModelForSequenceClassification.from_pretrained(base, num_labels=3)
         self.labels = ["neg","neu","pos"]
 
     def extract(self, text: str):
-        doc = self.nlp(text)
-        aspects = [ent.text for ent in doc.ents]  # simple; replace with custom aspect NER as needed
-        out = []
-        for a in aspects:
-            pair = f"[ASPECT] {a} [TEXT] {text}"
-            enc = self.tok(pair, return_tensors='pt', truncation=True, max_length=256)
-            with torch.no_grad():
-                logits = self.cls(**enc).logits.softmax(-1).squeeze().tolist()
-            pol = self.labels[int(max(range(3), key=lambda i: logits[i]))]
-            out.append({"aspect": a, "polarity": pol, "scores": logits})
-        return out
+        return self.extract_many([text])[0]
+
+    def extract_many(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        """extract() for many texts; spaCy runs them through nlp.pipe in batches."""
+        results = []
+        for text, doc in zip(texts, self.spacy.pipe(texts, NER)):
+            aspects = [ent.text for ent in doc.ents]  # simple; replace with custom aspect NER as needed
+            out = []
+            for a in aspects:
+                pair = f"[ASPECT] {a} [TEXT] {text}"
+                enc = self.tok(pair, return_tensors='pt', truncation=True, max_length=256)
+                with torch.no_grad():
+                    logits = self.cls(**enc).logits.softmax(-1).squeeze().tolist()
+                pol = self.labels[int(max(range(3), key=lambda i: logits[i]))]
+                out.append({"aspect": a, "polarity": pol, "scores": logits})
+            results.append(out)
+        return results
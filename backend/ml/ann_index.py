@@ -0,0 +1,343 @@
+# ml/ann_index.py
+"""
+FAISS index factory shared by services/index_bootstrap.build_index and
+ml/embed_index.EmbIndex, plus the per-query search knobs.
+
+All index types use inner product on L2-normalized vectors (= cosine sim):
+  - "flat" : exact brute force (IndexFlatIP), the recall baseline
+  - "ivf"  : IVF-Flat, k-means coarse quantizer with `nlist` trained centroids;
+             search visits `nprobe` lists
+  - "hnsw" : HNSW graph with `m` links per node; search explores `ef_search`
+             candidates
+
+Compressed encodings (smaller vectors, some recall loss):
+  - "fp16"  : scalar quantization to float16 (2 bytes/dim, near-lossless)
+  - "sq8"   : scalar quantization to int8 (1 byte/dim), per-dim ranges trained
+  - "ivfpq" : IVF + product quantization, `pq_m` sub-vectors of `pq_nbits`
+              bits each (e.g. 48 bytes/vector for 384-d at m=48, 8 bits)
+
+faiss.read_index restores any of these, so readers don't need to know
+which one was built.
+
+Indexes built by build_index are ID-mapped (IVF natively, everything else
+wrapped in IndexIDMap2), so FAISS ids = metadata store record ids even when
+vectors are appended later by the ingest embedder.
+"""
+
+from typing import Optional
+
+import numpy as np
+import faiss  # type: ignore
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "fp16", "sq8", "ivfpq")
+
+# sq8 only needs enough points to estimate per-dimension ranges
+SQ_TRAIN_POINTS = 10000
+
+# faiss wants ~39 training points per centroid, it warns below that
+MIN_POINTS_PER_CENTROID = 39
+
+# filtered_search: selections up to this many ids are scored exactly
+# instead of through the IVF lists / HNSW graph
+EXACT_FILTER_MAX = 4096
+# ... larger ones that come back short retry with nprobe / efSearch
+# multiplied by FILTER_WIDEN, at most FILTER_RETRIES times
+FILTER_WIDEN = 4
+FILTER_RETRIES = 3
+
+
+def make_index(
+    dim: int,
+    index_type: str = "flat",
+    nlist: int = 256,
+    hnsw_m: int = 32,
+    ef_construction: int = 80,
+    pq_m: int = 48,
+    pq_nbits: int = 8,
+) -> faiss.Index:
+    """
+    Create an empty index of the requested type. IVF / SQ8 / PQ indexes
+    still need train() before vectors can be added (see build_trained).
+    """
+    index_type = index_type.lower()
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "ivf":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    if index_type == "fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m_for(dim, pq_m), pq_nbits, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unsupported index type: {index_type}")
+
+
+def nlist_for(n_train: int, nlist: int) -> int:
+    """
+    Clamp the requested number of IVF lists to what the training sample
+    can support (small demo corpora would otherwise train garbage centroids).
+    """
+    return max(1, min(nlist, n_train // MIN_POINTS_PER_CENTROID))
+
+
+def pq_m_for(dim: int, pq_m: int) -> int:
+    """
+    PQ needs the sub-vector count to divide the dimension; take the largest
+    divisor of dim that is <= the requested pq_m.
+    """
+    for m in range(min(pq_m, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def pq_nbits_for(n_train: int, pq_nbits: int) -> int:
+    # each PQ codebook is a k-means with 2**nbits centroids; needs that many points
+    nbits = pq_nbits
+    while nbits > 1 and (1 << nbits) * MIN_POINTS_PER_CENTROID > n_train:
+        nbits -= 1
+    return nbits
+
+
+def train_sample_size(index_type: str, nlist: int) -> int:
+    """
+    How many vectors a streaming builder should buffer before training.
+    0 = no training needed.
+    """
+    index_type = index_type.lower()
+    if index_type == "ivf":
+        return nlist * MIN_POINTS_PER_CENTROID
+    if index_type == "ivfpq":
+        return max(nlist, 256) * MIN_POINTS_PER_CENTROID
+    if index_type == "sq8":
+        return SQ_TRAIN_POINTS
+    return 0
+
+
+def build_trained(
+    sample: np.ndarray,
+    index_type: str = "flat",
+    nlist: int = 256,
+    hnsw_m: int = 32,
+    pq_m: int = 48,
+    pq_nbits: int = 8,
+) -> faiss.Index:
+    """
+    Create + train an index from a sample of (normalized float32) vectors.
+    The sample is NOT added; callers add it (and the rest) afterwards.
+    """
+    dim = sample.shape[1]
+    if index_type.lower() in ("ivf", "ivfpq"):
+        nlist = nlist_for(len(sample), nlist)
+    if index_type.lower() == "ivfpq":
+        pq_nbits = pq_nbits_for(len(sample), pq_nbits)
+    index = make_index(dim, index_type, nlist=nlist, hnsw_m=hnsw_m, pq_m=pq_m, pq_nbits=pq_nbits)
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    return index
+
+
+def search_params(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    sel: Optional[faiss.IDSelector] = None,
+) -> Optional[faiss.SearchParameters]:
+    """
+    Per-query search parameters for `index.search(..., params=...)`.
+    Passed per call instead of mutating the shared index, so concurrent
+    searches with different knobs don't race. `sel` restricts the search to
+    matching ids (filtered search, ml/attr_store.py); the caller must keep it
+    (and whatever it points at) alive until the search returns.
+    Returns None when nothing applies (e.g. flat, no filter).
+    """
+    extra = {"sel": sel} if sel is not None else {}
+    # SearchParameters* objects carry their own defaults (nprobe=1,
+    # efSearch=16), so fall back to the index's settings, not theirs
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        if nprobe or extra:
+            return faiss.SearchParametersIVF(nprobe=int(nprobe or ivf.nprobe), **extra)
+        return None
+    except RuntimeError:
+        pass
+
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW) and (ef_search or extra):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search or inner.hnsw.efSearch), **extra)
+    return faiss.SearchParameters(**extra) if extra else None
+
+
+def bitmap_selector(bitmap: np.ndarray) -> faiss.IDSelector:
+    """
+    IDSelector over a packed little-endian id bitmap (bit i = id i, as from
+    np.packbits(mask, bitorder="little")). Keep `bitmap` alive while in use.
+    faiss bounds-checks against the length in bytes: ids past the end of the
+    bitmap (e.g. vectors added after the mask was taken) are not selected,
+    and the padding bits packbits adds are 0.
+    """
+    return faiss.IDSelectorBitmap(bitmap.nbytes, faiss.swig_ptr(bitmap))
+
+
+def filtered_search(
+    index: faiss.Index,
+    queries: np.ndarray,
+    k: int,
+    bitmap: np.ndarray,
+    n_match: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+):
+    """
+    index.search restricted to the ids set in `bitmap` (n_match of them),
+    returning (D, I) like index.search. A plain selector search over IVF or
+    HNSW only looks at the probed lists / visited graph nodes, so a narrow
+    filter can come back with fewer than k ids although more match. Here:
+      - flat / fp16 / sq8 scan every vector anyway: one selector search
+      - n_match <= EXACT_FILTER_MAX: exact. IVF probes all nlist lists with
+        the selector; HNSW scores the reconstructed selected vectors directly
+      - otherwise rows with fewer than min(k, n_match) ids are searched again
+        with nprobe / efSearch widened (see FILTER_WIDEN, FILTER_RETRIES)
+    Limits: IVF-PQ scores (and so exact-mode order) are still PQ
+    approximations, and a very selective filter over a huge selection can
+    stay short once the retries run out (IVF reaches nlist by then with the
+    defaults, HNSW doesn't).
+    """
+    sel = bitmap_selector(bitmap)
+    inner = _unwrap(index)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    is_hnsw = isinstance(inner, faiss.IndexHNSW)
+
+    if n_match <= EXACT_FILTER_MAX:
+        if ivf is not None:
+            return index.search(queries, k, params=faiss.SearchParametersIVF(nprobe=ivf.nlist, sel=sel))
+        if is_hnsw:
+            exact = _exact_scan(index, queries, k, bitmap)
+            if exact is not None:
+                return exact
+
+    D, I = index.search(queries, k, params=search_params(index, nprobe=nprobe, ef_search=ef_search, sel=sel))
+    if ivf is None and not is_hnsw:
+        return D, I
+
+    want = min(k, n_match)
+    nprobe = int(nprobe or ivf.nprobe) if ivf is not None else None
+    ef_search = int(ef_search or inner.hnsw.efSearch) if is_hnsw else None
+    for _ in range(FILTER_RETRIES):
+        short = np.flatnonzero((I >= 0).sum(axis=1) < want)
+        if len(short) == 0:
+            break
+        if ivf is not None:
+            if nprobe >= ivf.nlist:
+                break
+            nprobe = min(ivf.nlist, nprobe * FILTER_WIDEN)
+        else:
+            ef_search *= FILTER_WIDEN
+        params = search_params(index, nprobe=nprobe, ef_search=ef_search, sel=sel)
+        D[short], I[short] = index.search(queries[short], k, params=params)
+    return D, I
+
+
+def _exact_scan(index: faiss.Index, queries: np.ndarray, k: int, bitmap: np.ndarray):
+    # inner product against the stored vectors of the selected ids; None if
+    # the index can't reconstruct by id (IndexIDMap without the reverse map)
+    ids = np.flatnonzero(np.unpackbits(bitmap, bitorder="little")).astype(np.int64)
+    try:
+        vecs = index.reconstruct_batch(ids)
+    except RuntimeError:
+        return None
+    scores = queries @ vecs.T
+    top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    D = np.full((len(queries), k), -np.finfo(np.float32).max, dtype=np.float32)
+    I = np.full((len(queries), k), -1, dtype=np.int64)
+    D[:, :top.shape[1]] = np.take_along_axis(scores, top, axis=1)
+    I[:, :top.shape[1]] = ids[top]
+    return D, I
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def supports_ids(index: faiss.Index) -> bool:
+    """True if add_with_ids() works (IVF or an IndexIDMap wrapper)."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return True
+    try:
+        faiss.extract_index_ivf(index)
+        return True
+    except RuntimeError:
+        return False
+
+
+def id_mapped(index: faiss.Index) -> faiss.Index:
+    """
+    Wrap an (empty) index in IndexIDMap2 unless it already takes explicit ids.
+    """
+    if supports_ids(index):
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def ensure_id_mapped(index: faiss.Index) -> faiss.Index:
+    """
+    Upgrade a populated legacy flat index (plain IndexFlatIP, ids implicit)
+    to IndexIDMap2 so it can take explicit ids. Other index types are
+    returned unchanged.
+    """
+    if supports_ids(index) or not isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+        return index
+    vecs = index.reconstruct_n(0, index.ntotal)
+    mapped = faiss.IndexIDMap2(faiss.IndexFlat(index.d, index.metric_type))
+    mapped.add_with_ids(vecs, np.arange(index.ntotal, dtype=np.int64))
+    return mapped
+
+
+def add_vectors(index: faiss.Index, vecs: np.ndarray, first_id: int) -> None:
+    """
+    Add vectors with ids first_id, first_id + 1, ... . Indexes without id
+    support (legacy flat files) can only append at ntotal, so the ids must
+    line up with it.
+    """
+    vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+    if supports_ids(index):
+        ids = np.arange(first_id, first_id + len(vecs), dtype=np.int64)
+        index.add_with_ids(vecs, ids)
+        return
+    if first_id != index.ntotal:
+        raise ValueError(
+            f"index without id map has {index.ntotal} vectors, cannot add at id {first_id}"
+        )
+    index.add(vecs)
+
+
+def describe(index: faiss.Index) -> str:
+    inner = _unwrap(index)
+    outer = faiss.downcast_index(index)
+    if inner is outer:
+        return type(inner).__name__
+    return f"{type(outer).__name__}({type(inner).__name__})"
+
+
+def bytes_per_vector(index: faiss.Index) -> float:
+    """
+    Serialized index size / number of vectors: what a vector really costs on
+    disk and in RAM once loaded, including IVF lists, ids and graph links.
+    """
+    if index.ntotal == 0:
+        return 0.0
+    return faiss.serialize_index(index).nbytes / index.ntotal
@@ -0,0 +1,276 @@
+# ml/attr_store.py
+"""
+Filterable attribute columns for the metadata store (ml/meta_store.py).
+
+Next to <name>.jsonl / <name>.idx a store keeps:
+  - <name>.attrs      : one fixed-width row per record (FAISS id i = row i)
+                        domain u16, source u16, product u32 (codes), rating f32
+  - <name>.vocab.json : {"domain": [...], "source": [...], "product": [...]},
+                        code c = value at position c - 1 (0 = missing)
+
+Filtered search turns the filter into an id bitmap over these columns and
+hands it to FAISS as an IDSelector, so the ANN search itself only visits
+matching ids and a filtered query still returns a full k (unlike
+post-filtering the unfiltered top-k). Masks per (attribute, value) are
+cached, so a repeated filter costs an AND + packbits over the id range
+rather than a column scan.
+
+MetaStoreWriter keeps the columns in step with the records; stores written
+before the columns existed get them backfilled on first open.
+"""
+
+import json
+import math
+import os
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+ATTR_DTYPE = np.dtype([("domain", "<u2"), ("source", "<u2"), ("product", "<u4"), ("rating", "<f4")])
+CODED_FIELDS = ("domain", "source", "product")
+FILTER_FIELDS = CODED_FIELDS + ("min_rating", "max_rating")
+# cached per-value bitmaps (each N/8 bytes)
+MASK_CACHE_SIZE = 256
+
+PathLike = Union[str, Path]
+
+
+def attrs_path_for(records_path: PathLike) -> Path:
+    return Path(records_path).with_suffix(".attrs")
+
+
+def vocab_path_for(records_path: PathLike) -> Path:
+    return Path(records_path).with_suffix(".vocab.json")
+
+
+def _load_vocab(path: Path) -> Dict[str, List[str]]:
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+    else:
+        vocab = {}
+    return {field: list(vocab.get(field, [])) for field in CODED_FIELDS}
+
+
+def _rating(value: Any) -> float:
+    try:
+        r = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return r
+
+
+class AttrWriter:
+    """
+    Append-side of the columns. Owned by MetaStoreWriter, one row per record.
+    """
+
+    def __init__(self, records_path: PathLike, mode: str = "w"):
+        self.attrs_path = attrs_path_for(records_path)
+        self.vocab_path = vocab_path_for(records_path)
+        if mode == "w":
+            self._vocab = {field: [] for field in CODED_FIELDS}
+        else:
+            self._vocab = _load_vocab(self.vocab_path)
+        self._codes = {field: {v: i + 1 for i, v in enumerate(vals)} for field, vals in self._vocab.items()}
+        self._vocab_dirty = mode == "w"
+        self._f = open(self.attrs_path, mode + "b")
+        self._f.seek(0, os.SEEK_END)
+
+    def __len__(self) -> int:
+        return self._f.tell() // ATTR_DTYPE.itemsize
+
+    def _code(self, field: str, value: Any) -> int:
+        if value is None or value == "":
+            return 0
+        value = str(value)
+        code = self._codes[field].get(value)
+        if code is None:
+            self._vocab[field].append(value)
+            code = len(self._vocab[field])
+            self._codes[field][value] = code
+            self._vocab_dirty = True
+        return code
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        rows = [
+            (
+                self._code("domain", r.get("domain")),
+                self._code("source", r.get("source")),
+                self._code("product", r.get("product")),
+                _rating(r.get("rating")),
+            )
+            for r in records
+        ]
+        if rows:
+            self._f.write(np.array(rows, dtype=ATTR_DTYPE).tobytes())
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self.extend([record])
+
+    def flush(self) -> None:
+        self._f.flush()
+        if self._vocab_dirty:
+            tmp = self.vocab_path.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._vocab, f, ensure_ascii=False)
+            os.replace(tmp, self.vocab_path)
+            self._vocab_dirty = False
+
+    def close(self) -> None:
+        self.flush()
+        self._f.close()
+
+
+def backfill_attrs(records_path: PathLike) -> int:
+    """
+    (Re)build the columns from the records file, for stores written before
+    they existed. Returns the number of rows written.
+    """
+    w = AttrWriter(records_path, mode="w")
+    n = 0
+    batch: List[Dict[str, Any]] = []
+    with open(records_path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= 10000:
+                w.extend(batch)
+                n += len(batch)
+                batch.clear()
+    w.extend(batch)
+    n += len(batch)
+    w.close()
+    return n
+
+
+def attr_rows(records_path: PathLike) -> int:
+    path = attrs_path_for(records_path)
+    return path.stat().st_size // ATTR_DTYPE.itemsize if path.exists() else -1
+
+
+def ensure_attrs(records_path: PathLike, n_records: int) -> bool:
+    """
+    Backfill the columns if they are missing or out of step with a store of
+    n_records records. Returns True if it had to.
+    """
+    if attr_rows(records_path) == n_records:
+        return False
+    backfill_attrs(records_path)
+    return True
+
+
+class AttrIndex:
+    """
+    Read side: mmap'd columns + vocab, turned into id bitmaps for filters.
+    refresh() picks up rows appended since (after MetaStore.refresh()).
+    """
+
+    def __init__(self, records_path: PathLike):
+        self.attrs_path = attrs_path_for(records_path)
+        self.vocab_path = vocab_path_for(records_path)
+        self._lock = Lock()
+        self._masks: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._cols = np.zeros(0, dtype=ATTR_DTYPE)
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        size = self.attrs_path.stat().st_size if self.attrs_path.exists() else 0
+        n = size // ATTR_DTYPE.itemsize
+        cols = np.memmap(self.attrs_path, dtype=ATTR_DTYPE, mode="r", shape=(n,)) if n else np.zeros(0, dtype=ATTR_DTYPE)
+        vocab = _load_vocab(self.vocab_path)
+        codes = {field: {v: i + 1 for i, v in enumerate(vals)} for field, vals in vocab.items()}
+        with self._lock:
+            self._cols = cols
+            self._codes = codes
+            # cached bitmaps are sized for the old row count
+            self._masks.clear()
+
+    def __len__(self) -> int:
+        return len(self._cols)
+
+    def values(self, field: str) -> List[str]:
+        """Known values of a coded field (for UIs / validation)."""
+        return sorted(self._codes.get(field, {}))
+
+    def _value_mask(self, cols: np.ndarray, field: str, values: Sequence[str]) -> np.ndarray:
+        key = (len(cols), field, tuple(sorted(values)))
+        with self._lock:
+            hit = self._masks.get(key)
+            if hit is not None:
+                self._masks.move_to_end(key)
+                return hit
+        codes = [self._codes[field].get(v) for v in values]
+        codes = [c for c in codes if c is not None]
+        if not codes:
+            mask = np.zeros(len(cols), dtype=bool)
+        elif len(codes) == 1:
+            mask = cols[field] == codes[0]
+        else:
+            mask = np.isin(cols[field], codes)
+        with self._lock:
+            self._masks[key] = mask
+            if len(self._masks) > MASK_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        return mask
+
+    def mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        Boolean mask over record ids for filters like
+        {"domain": "health" | [...], "source": ..., "product": ...,
+         "min_rating": 4, "max_rating": 5}. None means "no filter".
+        Unknown keys raise ValueError.
+        """
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported filter(s): {', '.join(sorted(unknown))}")
+        cols = self._cols
+        mask: Optional[np.ndarray] = None
+        for field in CODED_FIELDS:
+            values = filters.get(field)
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            m = self._value_mask(cols, field, values)
+            mask = m.copy() if mask is None else (mask & m)
+
+        lo, hi = filters.get("min_rating"), filters.get("max_rating")
+        if lo is not None or hi is not None:
+            r = cols["rating"]
+            # NaN (no rating) never matches a rating range
+            m = np.ones(len(cols), dtype=bool) if lo is None else (r >= float(lo))
+            if hi is not None:
+                m &= r <= float(hi)
+            mask = m if mask is None else (mask & m)
+        return mask
+
+    def bitmap(self, filters: Dict[str, Any]):
+        """
+        (packed little-endian id bitmap, n_ids, n_matching) for
+        faiss.IDSelectorBitmap, or None when there is no filter.
+        """
+        mask = self.mask(filters)
+        if mask is None:
+            return None
+        return np.packbits(mask, bitorder="little"), len(mask), int(mask.sum())
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Drop unset keys; lists become sorted tuples so filters can be dict keys.
+    Raises ValueError on keys that aren't filterable.
+    """
+    out: Dict[str, Any] = {}
+    for k, v in (filters or {}).items():
+        if k not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter: {k}")
+        if v is None or v == [] or v == "":
+            continue
+        out[k] = tuple(sorted(v)) if isinstance(v, (list, tuple, set)) else v
+    return out
@@ -0,0 +1,209 @@
+# ml/embed_cache.py
+"""
+Persistent, content-addressed embedding cache.
+
+Index rebuilds re-embed every row even when almost nothing changed. The
+cache maps sha1(model name + text) -> vector, so a rebuild only runs the
+model on texts it hasn't seen with this model before.
+
+One cache = one directory:
+  - manifest.json : {"model": ..., "dim": ...}
+  - keys.bin      : 20-byte sha1 digests, one per entry, append-only
+  - vecs.f32      : float32 rows (dim each), entry i = row i, append-only,
+                    mmap'd for reads
+
+Vectors are stored L2-normalized (every index here is inner product over
+normalized vectors). Opening a cache with a different model or dim wipes it,
+so stale embeddings never leak into a new index. A crash mid-append is
+tolerated: entries are only counted up to what both files fully hold.
+
+Used by services/index_bootstrap.build_index and ml/embed_index.EmbIndex.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+KEY_BYTES = 20  # sha1
+PathLike = Union[str, Path]
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    h = hashlib.sha1()
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.digest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: PathLike, model_name: str, dim: int):
+        self.cache_dir = Path(cache_dir)
+        self.model_name = model_name
+        self.dim = int(dim)
+        self.keys_path = self.cache_dir / "keys.bin"
+        self.vecs_path = self.cache_dir / "vecs.f32"
+        self.manifest_path = self.cache_dir / "manifest.json"
+
+        self._open_dir()
+
+        self._row_bytes = 4 * self.dim
+        n_keys = self.keys_path.stat().st_size // KEY_BYTES
+        n_vecs = self.vecs_path.stat().st_size // self._row_bytes
+        self._count = min(n_keys, n_vecs)
+        # drop a torn tail left by a crash mid-append
+        if n_keys != self._count:
+            os.truncate(self.keys_path, self._count * KEY_BYTES)
+        if n_vecs != self._count:
+            os.truncate(self.vecs_path, self._count * self._row_bytes)
+
+        self._index: Dict[bytes, int] = {}
+        if self._count:
+            raw = self.keys_path.read_bytes()
+            for i in range(self._count):
+                self._index[raw[i * KEY_BYTES:(i + 1) * KEY_BYTES]] = i
+
+        self._keys_f = open(self.keys_path, "ab")
+        self._vecs_f = open(self.vecs_path, "ab")
+        self._vecs: Optional[np.memmap] = None
+        self._mapped = 0
+        # keys looked up since open; compact() keeps only these
+        self._touched: set = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _open_dir(self) -> None:
+        manifest = {"model": self.model_name, "dim": self.dim}
+        if self.manifest_path.exists():
+            try:
+                current = json.loads(self.manifest_path.read_text())
+            except ValueError:
+                current = None
+            if current != manifest:
+                # different model (or unreadable manifest): every entry is stale
+                shutil.rmtree(self.cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if not self.manifest_path.exists():
+            self.manifest_path.write_text(json.dumps(manifest))
+        self.keys_path.touch()
+        self.vecs_path.touch()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _rows(self, ids: Sequence[int]) -> np.ndarray:
+        if self._vecs is None or self._mapped < self._count:
+            self._vecs_f.flush()
+            self._vecs = np.memmap(self.vecs_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+            self._mapped = self._count
+        return np.asarray(self._vecs[np.asarray(ids, dtype=np.int64)])
+
+    def _append(self, keys: List[bytes], vecs: np.ndarray) -> None:
+        self._vecs_f.write(np.ascontiguousarray(vecs, dtype=np.float32).tobytes())
+        self._keys_f.write(b"".join(keys))
+        for k in keys:
+            self._index[k] = self._count
+            self._count += 1
+
+    def encode(
+        self,
+        texts: Sequence[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Vectors for `texts`, in order. Cached texts are read from disk, the
+        rest go to encode_fn(list_of_texts) -> (n, dim) in one call and are
+        added to the cache. Duplicates within `texts` are encoded once.
+        """
+        keys = [cache_key(self.model_name, t) for t in texts]
+        self._touched.update(keys)
+
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        hit_pos: List[int] = []
+        hit_rows: List[int] = []
+        miss: Dict[bytes, List[int]] = {}
+        for pos, k in enumerate(keys):
+            row = self._index.get(k)
+            if row is not None:
+                hit_pos.append(pos)
+                hit_rows.append(row)
+            else:
+                miss.setdefault(k, []).append(pos)
+
+        if hit_rows:
+            out[hit_pos] = self._rows(hit_rows)
+        self.hits += len(hit_pos)
+
+        if miss:
+            miss_keys = list(miss)
+            firsts = [miss[k][0] for k in miss_keys]
+            vecs = np.asarray(encode_fn([texts[p] for p in firsts]), dtype=np.float32)
+            if vecs.shape != (len(miss_keys), self.dim):
+                raise ValueError(f"encode_fn returned {vecs.shape}, expected ({len(miss_keys)}, {self.dim})")
+            vecs = vecs / (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-10)
+            self._append(miss_keys, vecs)
+            for k, v in zip(miss_keys, vecs):
+                out[miss[k]] = v
+            self.misses += sum(len(p) for p in miss.values())
+
+        return out
+
+    def flush(self) -> None:
+        # vectors first, so a counted key always has its row on disk
+        self._vecs_f.flush()
+        self._keys_f.flush()
+
+    def compact(self, min_dead_fraction: float = 0.5) -> int:
+        """
+        Rewrite the cache keeping only entries looked up since it was opened
+        (i.e. what the last full rebuild used), once more than
+        `min_dead_fraction` of the entries are dead. Returns entries dropped.
+        """
+        live = [k for k in self._touched if k in self._index]
+        dead = self._count - len(live)
+        if self._count == 0 or dead / self._count <= min_dead_fraction:
+            return 0
+
+        self.flush()
+        rows = [self._index[k] for k in live]
+        vecs = self._rows(rows) if rows else np.empty((0, self.dim), dtype=np.float32)
+        self.close()
+
+        tmp_keys = self.keys_path.with_suffix(".bin.tmp")
+        tmp_vecs = self.vecs_path.with_suffix(".f32.tmp")
+        tmp_keys.write_bytes(b"".join(live))
+        tmp_vecs.write_bytes(np.ascontiguousarray(vecs, dtype=np.float32).tobytes())
+        # empty the key file first: a crash before the last replace then
+        # leaves an empty (but consistent) cache instead of keys pointing
+        # at the wrong rows
+        os.truncate(self.keys_path, 0)
+        os.replace(tmp_vecs, self.vecs_path)
+        os.replace(tmp_keys, self.keys_path)
+
+        self._index = {k: i for i, k in enumerate(live)}
+        self._count = len(live)
+        self._keys_f = open(self.keys_path, "ab")
+        self._vecs_f = open(self.vecs_path, "ab")
+        return dead
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": self._count, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self.flush()
+        self._keys_f.close()
+        self._vecs_f.close()
+        self._vecs = None
+        self._mapped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
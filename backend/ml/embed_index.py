@@ -1,12 +1,29 @@
 import os
-import json
-from typing import List, Dict, Any
+import shutil
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
 
 import numpy as np
 import faiss  # type: ignore
 from sentence_transformers import SentenceTransformer
 from sqlalchemy import create_engine, text
 
+from .ann_index import build_trained, filtered_search, make_index, search_params, train_sample_size
+from .attr_store import AttrIndex, attrs_path_for, ensure_attrs, normalize_filters, vocab_path_for
+from .embed_cache import EmbeddingCache
+from .index_versions import (
+    active_dir,
+    current_version,
+    gc_versions,
+    new_version_dir,
+    publish,
+    read_build_state,
+    write_build_state,
+)
+from .meta_store import MetaStore, MetaStoreWriter, convert_legacy_meta, index_path_for, store_exists
+from .parallel_embed import ShardedEncoder
+from .query_batcher import QueryBatcher
+
 # ---- config ----
 DB_URL = os.getenv(
     "DATABASE_URL",
@@ -14,14 +31,43 @@ DB_URL = os.getenv(
 )
 INDEX_DIR = os.getenv("INDEX_DIR", "/data/index")
 EMB_MODEL = os.getenv("EMB_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "flat" | "ivf" | "hnsw" | "fp16" | "sq8" | "ivfpq", see ml/ann_index.py
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+INDEX_NLIST = int(os.getenv("INDEX_NLIST", "256"))
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "48"))
+INDEX_PQ_NBITS = int(os.getenv("INDEX_PQ_NBITS", "8"))
+# search-time recall knobs when search() isn't given them; without these an
+# IVF index is probed with faiss' nprobe=1
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+# retired index versions are deleted after this many seconds (ml/index_versions.py)
+INDEX_GC_GRACE_S = float(os.getenv("INDEX_GC_GRACE_S", "600"))
+# embedding cache reused across build() calls (ml/embed_cache.py); "" disables it
+EMB_CACHE_DIR = os.getenv("EMB_CACHE_DIR", "/data/embed_cache")
+# build() embeds in this many processes, one shard each (ml/parallel_embed.py);
+# EMB_BUILD_THREADS per process, 0 = cores / workers
+EMB_BUILD_WORKERS = int(os.getenv("EMB_BUILD_WORKERS", "1"))
+EMB_BUILD_THREADS = int(os.getenv("EMB_BUILD_THREADS", "0"))
+# rows fetched (server-side cursor), embedded and written per step of build()
+EMB_BUILD_CHUNK = int(os.getenv("EMB_BUILD_CHUNK", "2048"))
+# per-version build state (ml/index_versions.BUILD_STATE):
+# {"last_id", "rows", "added"[, "base_version", "base_rows"]}, for incremental builds
+# concurrent search() calls share one encode + index.search (ml/query_batcher.py)
+QUERY_BATCH_ENABLED = os.getenv("QUERY_BATCH_ENABLED", "1") not in ("0", "false", "False")
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "3"))
 
 
 class EmbIndex:
     """
     - pull reviews from Postgres
     - embed them with sentence-transformers
-    - build FAISS IP index
+    - build FAISS IP index (flat / IVF / HNSW, optionally fp16 / int8 / PQ compressed)
     - serve semantic search
+    Each build goes to a new version dir under INDEX_DIR and is published
+    atomically (ml/index_versions.py); search() notices a newer published
+    version and reloads.
     """
 
     def __init__(self):
@@ -29,135 +75,325 @@ class EmbIndex:
         self.model = SentenceTransformer(EMB_MODEL)
 
         os.makedirs(INDEX_DIR, exist_ok=True)
-        self.faiss_path = os.path.join(INDEX_DIR, "index.faiss")
-        self.meta_path = os.path.join(INDEX_DIR, "meta.json")
+        self.version: Optional[str] = None
+        self._use_dir(str(active_dir(INDEX_DIR)))
+
+        self.index = None  # faiss.Index
+        self.meta: Optional[MetaStore] = None
+        self.attrs: Optional[AttrIndex] = None
+
+        self.batcher: Optional[QueryBatcher] = None
+        if QUERY_BATCH_ENABLED:
+            self.batcher = QueryBatcher(
+                self._search_many,
+                max_batch=QUERY_BATCH_MAX,
+                max_wait_ms=QUERY_BATCH_WAIT_MS,
+                name="emb-query-batcher",
+            )
+
+    def _use_dir(self, index_dir: str) -> None:
+        self.faiss_path = os.path.join(index_dir, "index.faiss")
+        # metadata store (meta.jsonl + meta.idx, see ml/meta_store.py), shared
+        # format with services/index_bootstrap; meta.json is the legacy file
+        self.meta_path = os.path.join(index_dir, "meta.jsonl")
+        self.legacy_meta_path = os.path.join(index_dir, "meta.json")
 
-        self.index = None  # faiss.IndexFlatIP
-        self.meta: List[Dict[str, Any]] = []
+    def _publish(self, version_dir) -> None:
+        publish(INDEX_DIR, version_dir)
+        gc_versions(INDEX_DIR, INDEX_GC_GRACE_S)
+        self.version = version_dir.name
 
-    def build(self) -> None:
+    def build(
+        self,
+        index_type: str = INDEX_TYPE,
+        nlist: int = INDEX_NLIST,
+        hnsw_m: int = INDEX_HNSW_M,
+        pq_m: int = INDEX_PQ_M,
+        pq_nbits: int = INDEX_PQ_NBITS,
+        workers: int = EMB_BUILD_WORKERS,
+        chunk_size: int = EMB_BUILD_CHUNK,
+        incremental: bool = False,
+    ) -> int:
         """
         Build index from whatever is in the `reviews` table.
-        Writes both FAISS index + metadata file to disk.
+        Writes both FAISS index + metadata file to a new version dir and
+        publishes it. workers > 1 splits the embedding into that many shards,
+        each embedded by its own model process, merged back in row order.
+
+        Rows are streamed with a server-side cursor, chunk_size at a time,
+        in id order; each chunk is embedded, added and its metadata appended
+        before the next is fetched, so memory is bounded by the chunk (plus
+        the FAISS index itself and, for trained types, the training sample).
+
+        incremental=True starts from a copy of the published version and
+        only adds rows with id > the last id it indexed (kept in its
+        build.json); the index type is whatever that version was built with.
+        Without a previous build.json it falls back to a full build. Returns
+        the number of rows this build added (0 = nothing new, nothing published).
         """
+        base = self._incremental_base() if incremental else None
+        # readers keep serving the current version until _publish(); the
+        # build only writes under version_dir and leaves self.faiss_path /
+        # self.meta_path (which search() may reload meanwhile) alone
+        version_dir = new_version_dir(INDEX_DIR)
+        try:
+            added, faiss_index = self._build_into(
+                version_dir, base, index_type, nlist, hnsw_m, pq_m, pq_nbits, workers, chunk_size,
+            )
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
 
-        # 1. fetch rows from DB
-        with self.engine.connect() as conn:
-            result = conn.execute(text("SELECT id, text FROM reviews"))
-            # SQLAlchemy 2.x returns Row objects; use ._mapping
-            rows = [dict(r._mapping) for r in result]
+        if base is not None and added == 0:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            return 0
 
-        # no data case
-        if not rows:
-            self._save_empty()
-            return
+        meta_path = str(version_dir / "meta.jsonl")
+        meta, attrs = MetaStore(meta_path), AttrIndex(meta_path)
+        self._publish(version_dir)
+        # keep the index in memory, metadata stays mmap'd
+        self._use_dir(str(version_dir))
+        self.index, self.meta, self.attrs = faiss_index, meta, attrs
+        return added
 
-        ids = [row["id"] for row in rows]
-        texts = [row["text"] for row in rows]
+    def _incremental_base(self) -> Optional[Tuple[Path, Any]]:
+        """(published version dir, last indexed id), or None if it has no build.json."""
+        src = active_dir(INDEX_DIR)
+        state = read_build_state(src)
+        if state.get("last_id") is None or not (src / "index.faiss").exists():
+            return None
+        return src, state["last_id"]
 
-        # 2. embed -> normalized float32
-        embeddings = self.model.encode(
-            texts,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-        )
-        if embeddings.dtype != np.float32:
-            embeddings = embeddings.astype(np.float32)
-
-        # 3. build FAISS index (cosine == dot product because normalized)
-        dim = embeddings.shape[1]
-        faiss_index = faiss.IndexFlatIP(dim)
-        faiss_index.add(embeddings)
-
-        # 4. save index + metadata
-        faiss.write_index(faiss_index, self.faiss_path)
-
-        meta_list = []
-        for rid, txt in zip(ids, texts):
-            meta_list.append(
-                {
-                    "id": rid,
-                    "text": txt,
-                }
+    def _build_into(
+        self,
+        version_dir: Path,
+        base: Optional[Tuple[Path, Any]],
+        index_type: str,
+        nlist: int,
+        hnsw_m: int,
+        pq_m: int,
+        pq_nbits: int,
+        workers: int,
+        chunk_size: int,
+    ) -> Tuple[int, Any]:
+        dim = self.model.get_sentence_embedding_dimension()
+        faiss_index = None
+        last_id = None
+        state: Dict[str, Any] = {}
+        if base is not None:
+            src, last_id = base
+            src_meta = src / "meta.jsonl"
+            ensure_attrs(src_meta, len(MetaStore(src_meta)))
+            for path in (src_meta, index_path_for(src_meta), attrs_path_for(src_meta), vocab_path_for(src_meta)):
+                if path.exists():
+                    shutil.copy2(path, version_dir / path.name)
+            faiss_index = faiss.read_index(str(src / "index.faiss"))
+            # rows ingest appends to `src` after this are carried over on
+            # reload (services/semantic_index), from base_rows on
+            state.update(base_version=src.name, base_rows=int(faiss_index.ntotal))
+
+        # IVF centroids / SQ ranges / PQ codebooks are trained on the first
+        # train_n embeddings, held back until they are all there
+        train_n = train_sample_size(index_type, nlist) if faiss_index is None else 0
+        if faiss_index is None and not train_n:
+            faiss_index = make_index(dim, index_type, nlist=nlist, hnsw_m=hnsw_m, pq_m=pq_m, pq_nbits=pq_nbits)
+        pending: List[np.ndarray] = []
+
+        def add(vecs: Optional[np.ndarray]) -> None:
+            nonlocal faiss_index
+            if faiss_index is not None:
+                if vecs is not None:
+                    faiss_index.add(vecs)
+                return
+            if vecs is not None:
+                pending.append(vecs)
+            if pending and (vecs is None or sum(len(v) for v in pending) >= train_n):
+                sample = np.vstack(pending)
+                faiss_index = build_trained(
+                    sample, index_type, nlist=nlist, hnsw_m=hnsw_m, pq_m=pq_m, pq_nbits=pq_nbits
+                )
+                faiss_index.add(sample)
+                pending.clear()
+
+        # embed -> normalized float32; texts embedded by a previous build
+        # (same model) come out of the cache instead of the model.
+        # Both are opened inside the try below so neither leaks on error.
+        sharded: Optional[ShardedEncoder] = None
+        cache: Optional[EmbeddingCache] = None
+
+        def encode(batch: List[str]) -> np.ndarray:
+            if sharded is not None:
+                vecs = np.ascontiguousarray(sharded(batch), dtype=np.float32)
+                faiss.normalize_L2(vecs)
+                return vecs
+            return self.model.encode(
+                batch,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
             )
 
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            json.dump(meta_list, f)
+        sql = "SELECT id, text, domain, product, rating FROM reviews"
+        params: Dict[str, Any] = {}
+        if last_id is not None:
+            sql += " WHERE id > :last_id"
+            params["last_id"] = last_id
+        sql += " ORDER BY id"
 
-        # keep in memory
-        self.index = faiss_index
-        self.meta = meta_list
+        added = 0
+        try:
+            if workers > 1:
+                sharded = ShardedEncoder(EMB_MODEL, workers, EMB_BUILD_THREADS or None)
+            if EMB_CACHE_DIR:
+                cache = EmbeddingCache(os.path.join(EMB_CACHE_DIR, "reviews"), EMB_MODEL, dim)
+            with self.engine.connect() as conn, \
+                    MetaStoreWriter(version_dir / "meta.jsonl", mode="a" if base is not None else "w") as w:
+                # server-side cursor: the driver fetches chunk_size rows per round trip
+                result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(sql), params)
+                for part in result.partitions(chunk_size):
+                    # SQLAlchemy 2.x returns Row objects; use ._mapping
+                    rows = [dict(r._mapping) for r in part]
+                    texts = [row["text"] for row in rows]
+                    vecs = cache.encode(texts, encode) if cache is not None else encode(texts)
+                    add(np.ascontiguousarray(vecs, dtype=np.float32))
 
-    def _save_empty(self) -> None:
-        """
-        If there are zero rows, create an empty index so healthcheck doesn't stay degraded.
-        """
-        dim = 384  # all-MiniLM-L6-v2 output size
-        faiss_index = faiss.IndexFlatIP(dim)
+                    # domain / product / rating also land in the filter columns (ml/attr_store.py)
+                    w.extend(
+                        {
+                            "id": row["id"],
+                            "text": row["text"],
+                            "domain": row.get("domain"),
+                            "product": row.get("product"),
+                            "rating": float(row["rating"]) if row.get("rating") is not None else None,
+                        }
+                        for row in rows
+                    )
+                    added += len(rows)
+                    last_id = rows[-1]["id"]
 
-        faiss.write_index(faiss_index, self.faiss_path)
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            json.dump([], f)
+            if cache is not None and base is None:
+                # a full build touched every live text; the rest is stale
+                # (an incremental one only touched the new rows)
+                cache.compact()
+        finally:
+            try:
+                if cache is not None:
+                    cache.close()
+            finally:
+                if sharded is not None:
+                    sharded.close()
 
-        self.index = faiss_index
-        self.meta = []
+        # corpus smaller than the training sample: train on all of it;
+        # no rows at all: an empty index so healthcheck doesn't stay degraded
+        add(None)
+        if faiss_index is None:
+            faiss_index = faiss.IndexFlatIP(dim)
+
+        faiss.write_index(faiss_index, str(version_dir / "index.faiss"))
+        state.update(last_id=last_id, rows=int(faiss_index.ntotal), added=added)
+        write_build_state(version_dir, state)
+        return added, faiss_index
 
     def _load_from_disk(self) -> None:
         """
-        Lazy-load FAISS + metadata into memory.
+        Lazy-load FAISS into memory and mmap the metadata store
+        (migrating a legacy meta.json on the way if that's all there is)
+        from the published version.
         """
-        if not (os.path.exists(self.faiss_path) and os.path.exists(self.meta_path)):
+        self.version = current_version(INDEX_DIR)
+        self._use_dir(str(active_dir(INDEX_DIR)))
+        if not store_exists(self.meta_path) and os.path.exists(self.legacy_meta_path):
+            convert_legacy_meta(self.legacy_meta_path, self.meta_path)
+
+        if not (os.path.exists(self.faiss_path) and store_exists(self.meta_path)):
             self.index = None
-            self.meta = []
+            self.meta = None
             return
 
-        faiss_index = faiss.read_index(self.faiss_path)
-        with open(self.meta_path, "r", encoding="utf-8") as f:
-            meta_list = json.load(f)
-
-        self.index = faiss_index
-        self.meta = meta_list
+        meta = MetaStore(self.meta_path)
+        ensure_attrs(self.meta_path, len(meta))
+        self.index, self.meta, self.attrs = faiss.read_index(self.faiss_path), meta, AttrIndex(self.meta_path)
 
-    def search(self, query: str, k: int = 10) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Return top-k matches from FAISS.
         Each hit: {rank, id, text, score}
+        nprobe / ef_search only matter for IVF / HNSW indexes and default to
+        INDEX_NPROBE / INDEX_EF_SEARCH.
+        filters: {"domain", "product", "min_rating", "max_rating"}, applied
+        inside the FAISS search (ml/attr_store.py).
         """
 
-        # make sure index + meta are in memory
-        if self.index is None or not self.meta:
+        # make sure index + meta are in memory, and the published version
+        if self.index is None or not self.meta or current_version(INDEX_DIR) != self.version:
             self._load_from_disk()
 
         if self.index is None or not self.meta:
             # still nothing indexed
             return []
 
+        req = (query, k, nprobe or INDEX_NPROBE, ef_search or INDEX_EF_SEARCH, tuple(sorted(normalize_filters(filters).items())))
+        if self.batcher is not None:
+            return self.batcher.submit(req)
+        return self._search_many([req])[0]
+
+    def _search_many(self, reqs: List[tuple]) -> List[List[Dict[str, Any]]]:
+        """
+        (query, k, nprobe, ef_search, filter_items) requests -> hits per request.
+        One encode for all queries, one index.search per distinct knobs + filter.
+        """
         q_emb = self.model.encode(
-            [query],
+            [r[0] for r in reqs],
             convert_to_numpy=True,
             normalize_embeddings=True,
         )
         if q_emb.dtype != np.float32:
             q_emb = q_emb.astype(np.float32)
 
-        scores, idxs = self.index.search(q_emb, k)
-        idxs = idxs[0]
-        scores = scores[0]
-
-        out: List[Dict[str, Any]] = []
-        for rank, (i, sc) in enumerate(zip(idxs, scores)):
-            if i < 0 or i >= len(self.meta):
-                continue
-            m = self.meta[i]
-            out.append(
-                {
-                    "rank": rank,
-                    "id": m["id"],
-                    "text": m["text"],
-                    "score": float(sc),
-                }
-            )
-        return out
+        groups: Dict[tuple, List[int]] = {}
+        for pos, (_, _, nprobe, ef_search, filter_items) in enumerate(reqs):
+            groups.setdefault((nprobe, ef_search, filter_items), []).append(pos)
+
+        # one consistent version for the whole batch, even if a reload lands meanwhile
+        index, meta, attrs = self.index, self.meta, self.attrs
+        results: List[List[Dict[str, Any]]] = [[] for _ in reqs]
+        for (nprobe, ef_search, filter_items), rows in groups.items():
+            k = max(reqs[pos][1] for pos in rows)
+            if filter_items:
+                bitmap, _, n_match = attrs.bitmap(dict(filter_items))
+                if n_match == 0:
+                    continue
+                scores, idxs = filtered_search(
+                    index, q_emb[rows], k, bitmap, n_match, nprobe=nprobe, ef_search=ef_search
+                )
+            else:
+                params = search_params(index, nprobe=nprobe, ef_search=ef_search)
+                scores, idxs = index.search(q_emb[rows], k, params=params)
+
+            for j, pos in enumerate(rows):
+                out = results[pos]
+                want = reqs[pos][1]
+                for rank, (i, sc) in enumerate(zip(idxs[j][:want], scores[j][:want])):
+                    if i < 0:
+                        break
+                    m = meta.get(int(i))
+                    if m is None:
+                        continue
+                    out.append(
+                        {
+                            "rank": rank,
+                            "id": m["id"],
+                            "text": m["text"],
+                            "score": float(sc),
+                        }
+                    )
+        return results
 
 
 # global singleton, this is what the routes import
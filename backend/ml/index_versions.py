@@ -0,0 +1,130 @@
+# ml/index_versions.py
+"""
+Versioned index directories with an atomic "current" pointer.
+
+Layout under an index root (settings.index_dir / INDEX_DIR):
+
+  versions/20251017T101500-3f2a/   index.faiss, meta.jsonl, meta.idx, ...
+  versions/20251018T093000-91bc/
+  current -> versions/20251018T093000-91bc     (relative symlink)
+
+A build writes a complete new version directory, then publish() points
+`current` at it with a symlink rename, which is atomic: a reader resolves
+either the old version or the new one, never a half-written mix.
+Superseded versions get a `.retired` stamp and gc_versions() deletes them
+once they've been retired for longer than a grace period, so processes
+still reading them have time to switch.
+
+A root without `current` (files directly in it, the pre-versioning layout)
+is served as-is until the first versioned build is published.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+PathLike = Union[str, Path]
+
+VERSIONS_DIR = "versions"
+CURRENT_LINK = "current"
+RETIRED_STAMP = ".retired"
+# per-version build facts written by the builder:
+#   rows         vectors the build itself put in (ids 0..rows-1); anything
+#                past that was appended later by ingest
+#   base_version / base_rows   (incremental builds) version it started from
+#                and how many of that version's rows it copied
+BUILD_STATE = "build.json"
+
+
+def active_dir(root: PathLike) -> Path:
+    """Directory of the published version (or the root itself, pre-versioning)."""
+    root = Path(root)
+    link = root / CURRENT_LINK
+    if link.is_symlink() or link.is_dir():
+        return link.resolve()
+    return root
+
+
+def read_build_state(version_dir: PathLike) -> Dict[str, Any]:
+    """The version's build.json, {} if it has none (older builds)."""
+    try:
+        with open(Path(version_dir) / BUILD_STATE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_build_state(version_dir: PathLike, state: Dict[str, Any]) -> None:
+    with open(Path(version_dir) / BUILD_STATE, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def current_version(root: PathLike) -> Optional[str]:
+    """Name of the published version, None for the legacy layout. One readlink."""
+    try:
+        return Path(os.readlink(Path(root) / CURRENT_LINK)).name
+    except OSError:
+        return None
+
+
+def new_version_dir(root: PathLike) -> Path:
+    """Fresh, empty, unpublished version directory."""
+    name = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + "-" + uuid.uuid4().hex[:4]
+    path = Path(root) / VERSIONS_DIR / name
+    path.mkdir(parents=True)
+    return path
+
+
+def publish(root: PathLike, version_dir: PathLike) -> Optional[str]:
+    """
+    Atomically make `version_dir` the current version. Returns the name of
+    the version it replaced (now stamped retired), if any.
+    """
+    root = Path(root)
+    version_dir = Path(version_dir)
+    previous = current_version(root)
+
+    tmp = root / f".{CURRENT_LINK}.{os.getpid()}.{uuid.uuid4().hex[:6]}"
+    os.symlink(os.path.join(VERSIONS_DIR, version_dir.name), tmp)
+    os.replace(tmp, root / CURRENT_LINK)
+
+    if previous and previous != version_dir.name:
+        stamp = root / VERSIONS_DIR / previous / RETIRED_STAMP
+        if stamp.parent.exists():
+            stamp.write_text(str(time.time()))
+    return previous
+
+
+def gc_versions(root: PathLike, grace_s: float, keep: int = 1) -> List[str]:
+    """
+    Delete versions retired more than `grace_s` ago, always keeping the
+    current one plus the `keep` most recently retired. Returns what was removed.
+    """
+    vdir = Path(root) / VERSIONS_DIR
+    if not vdir.exists():
+        return []
+    current = current_version(root)
+    now = time.time()
+
+    retired = []
+    for p in vdir.iterdir():
+        stamp = p / RETIRED_STAMP
+        if p.name == current or not stamp.exists():
+            continue
+        try:
+            retired_at = float(stamp.read_text())
+        except ValueError:
+            retired_at = stamp.stat().st_mtime
+        retired.append((retired_at, p))
+    retired.sort(reverse=True)
+
+    removed = []
+    for retired_at, p in retired[keep:]:
+        if now - retired_at >= grace_s:
+            shutil.rmtree(p, ignore_errors=True)
+            removed.append(p.name)
+    return removed
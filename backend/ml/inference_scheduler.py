@@ -0,0 +1,180 @@
+# ml/inference_scheduler.py
+"""
+Dynamic batching for model inference behind async endpoints.
+
+ml/query_batcher.py does this with a dispatcher thread for sync callers;
+InferenceScheduler is the asyncio version for `async def` routes
+(/model/predict), so waiting requests hold a future on the event loop
+instead of a threadpool thread:
+
+  - callers `await submit(item)`; the item goes on an asyncio.Queue
+  - a dispatcher task takes the first waiting item, then keeps collecting
+    for up to `max_delay_ms` (or until `max_batch` items, or until every
+    caller currently inside submit() is in the batch)
+  - `run_batch(items) -> results` (same length, same order) runs in the
+    default executor, so the loop keeps accepting requests meanwhile; the
+    next batch fills up while the current one is on the model
+  - result i resolves caller i's future; an exception goes to every caller
+    of that batch
+
+stats(): queue depth, batch-size histogram, and how long items waited in
+the queue before their batch started (mean / p50 / p95 / p99 / max over the
+last WAIT_SAMPLES items).
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+WAIT_SAMPLES = 2048
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * q))]
+
+
+class InferenceScheduler:
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch: int = 32,
+        max_delay_ms: float = 5.0,
+        name: str = "inference-scheduler",
+    ):
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_delay_s = max(0.0, max_delay_ms) / 1000.0
+        self.name = name
+        # bound to the loop of the first submit()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[Tuple[Any, asyncio.Future, float]]"] = None
+        self._task: Optional[asyncio.Task] = None
+        # callers awaiting submit(); no point waiting for more than that
+        self._inflight = 0
+
+        # histogram buckets: 1, 2, 4, ... up to max_batch
+        self._buckets: List[int] = []
+        b = 1
+        while b < max_batch:
+            self._buckets.append(b)
+            b *= 2
+        self._buckets.append(max_batch)
+        self._hist: Dict[int, int] = {b: 0 for b in self._buckets}
+        self._waits_ms: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._counters = {"items": 0, "batches": 0, "errors": 0, "max_batch_seen": 0, "run_ms": 0.0}
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._loop is loop and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run(), name=self.name)
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue `item` for the next batch and await its result.
+        """
+        self._ensure_started()
+        fut = self._loop.create_future()
+        self._inflight += 1
+        try:
+            self._queue.put_nowait((item, fut, time.perf_counter()))
+            return await fut
+        finally:
+            self._inflight -= 1
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or len(batch) >= self._inflight:
+                    # window closed, or everyone waiting is already in the
+                    # batch: still take whatever is queued, but don't wait
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # cancelled callers (client went away) don't need a slot
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.run_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"run_batch returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                self._counters["errors"] += 1
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            finally:
+                self._record(batch, start)
+
+            for (_, fut, _), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+    def _record(self, batch: List[Tuple[Any, asyncio.Future, float]], start: float) -> None:
+        n = len(batch)
+        self._counters["items"] += n
+        self._counters["batches"] += 1
+        self._counters["max_batch_seen"] = max(self._counters["max_batch_seen"], n)
+        self._counters["run_ms"] += (time.perf_counter() - start) * 1000.0
+        self._hist[next(b for b in self._buckets if n <= b)] += 1
+        self._waits_ms.extend((start - enqueued) * 1000.0 for _, _, enqueued in batch)
+
+    async def close(self):
+        """Stop the dispatcher; callers still waiting get CancelledError."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while self._queue is not None and not self._queue.empty():
+            _, fut, _ = self._queue.get_nowait()
+            fut.cancel()
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self._counters)
+        out["run_ms"] = round(out["run_ms"], 1)
+        out["mean_batch"] = round(out["items"] / out["batches"], 2) if out["batches"] else 0.0
+        out["mean_run_ms"] = round(out["run_ms"] / out["batches"], 2) if out["batches"] else 0.0
+        out["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        out["inflight"] = self._inflight
+        out["max_batch"] = self.max_batch
+        out["max_delay_ms"] = self.max_delay_s * 1000.0
+        # "<=n": batches with size in (previous bucket, n]
+        out["batch_size_hist"] = {f"<={b}": c for b, c in self._hist.items()}
+        waits = sorted(self._waits_ms)
+        out["wait_ms"] = {
+            "samples": len(waits),
+            "mean": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "p50": round(_percentile(waits, 0.50), 3),
+            "p95": round(_percentile(waits, 0.95), 3),
+            "p99": round(_percentile(waits, 0.99), 3),
+            "max": round(waits[-1], 3) if waits else 0.0,
+        }
+        return out
@@ -0,0 +1,181 @@
+# ml/meta_store.py
+"""
+Random-access metadata store for FAISS hits.
+
+One store = two files:
+  - <name>.jsonl : the records, one JSON object per line (FAISS id i = record i)
+  - <name>.idx   : fixed-width offset table, 16 bytes per record
+                   (uint64 offset, uint64 length, little-endian)
+plus the filterable attribute columns (<name>.attrs / <name>.vocab.json,
+see ml/attr_store.py), which the writer keeps in step with the records.
+
+Readers mmap both files and decode only the records they are asked for
+(the top-k hits), so opening a store costs the same no matter how many
+records it holds, and review text never sits in the Python heap.
+
+Used by services/index_bootstrap (writer), services/semantic_index (reader)
+and ml/embed_index (both).
+"""
+
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .attr_store import AttrWriter, ensure_attrs
+
+_ENTRY = struct.Struct("<QQ")
+PathLike = Union[str, Path]
+
+
+def index_path_for(records_path: PathLike) -> Path:
+    return Path(records_path).with_suffix(".idx")
+
+
+def store_exists(records_path: PathLike) -> bool:
+    return Path(records_path).exists() and index_path_for(records_path).exists()
+
+
+class MetaStoreWriter:
+    """
+    Append records to a store. ids are assigned in append order, which must
+    match the order vectors are added to FAISS.
+    mode="w" starts a new store, mode="a" continues an existing one.
+    """
+
+    def __init__(self, records_path: PathLike, mode: str = "w"):
+        if mode not in ("w", "a"):
+            raise ValueError(f"Unsupported mode: {mode}")
+        self.records_path = Path(records_path)
+        self.index_path = index_path_for(records_path)
+        self.records_path.parent.mkdir(parents=True, exist_ok=True)
+        self._data = open(self.records_path, mode + "b")
+        self._idx = open(self.index_path, mode + "b")
+        self._offset = self._data.seek(0, os.SEEK_END)
+        self._count = self._idx.seek(0, os.SEEK_END) // _ENTRY.size
+        if mode == "a":
+            # store from before the attribute columns: rebuild them first
+            ensure_attrs(records_path, self._count)
+        self._attrs = AttrWriter(records_path, mode)
+
+    def append(self, record: Dict[str, Any]) -> int:
+        self._attrs.append(record)
+        return self._append_record(record)
+
+    def _append_record(self, record: Dict[str, Any]) -> int:
+        payload = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._data.write(payload)
+        self._idx.write(_ENTRY.pack(self._offset, len(payload)))
+        self._offset += len(payload)
+        rid = self._count
+        self._count += 1
+        return rid
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        records = list(records)
+        for r in records:
+            self._append_record(r)
+        self._attrs.extend(records)
+
+    def flush(self) -> None:
+        # records first, so a reader never sees an offset past the data
+        self._data.flush()
+        self._attrs.flush()
+        self._idx.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._data.close()
+        self._attrs.close()
+        self._idx.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _map(path: Path) -> Optional[mmap.mmap]:
+    # mmap can't map an empty file
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MetaStore:
+    """
+    Read side. get(i) decodes record i on demand. refresh() remaps the files
+    after a writer appended to them.
+    """
+
+    def __init__(self, records_path: PathLike):
+        self.records_path = Path(records_path)
+        self.index_path = index_path_for(records_path)
+        if not store_exists(self.records_path):
+            raise FileNotFoundError(f"Metadata store not found at {self.records_path}")
+        self._lock = Lock()
+        # (records map, offsets map, count) swapped as one tuple, so a
+        # concurrent get() always sees a consistent triple
+        self._maps = (None, None, 0)
+        self.refresh()
+
+    def refresh(self) -> None:
+        # map the offsets first: every offset it holds is already in the records file
+        idx = _map(self.index_path)
+        data = _map(self.records_path)
+        count = (len(idx) // _ENTRY.size) if idx is not None else 0
+        with self._lock:
+            self._maps = (data, idx, count)
+        # old maps are left to the GC: a concurrent get() may still be slicing them
+
+    def __len__(self) -> int:
+        return self._maps[2]
+
+    def get(self, i: int) -> Optional[Dict[str, Any]]:
+        data, idx, count = self._maps
+        if i < 0 or i >= count:
+            return None
+        offset, length = _ENTRY.unpack_from(idx, i * _ENTRY.size)
+        if offset + length > len(data):
+            return None
+        return json.loads(data[offset:offset + length])
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Dict[str, Any]]]:
+        return [self.get(int(i)) for i in ids]
+
+    def close(self) -> None:
+        with self._lock:
+            data, idx, _ = self._maps
+            self._maps = (None, None, 0)
+        for m in (data, idx):
+            if m is not None:
+                m.close()
+
+
+def convert_legacy_meta(legacy_path: PathLike, records_path: PathLike) -> int:
+    """
+    One-off migration from the old metadata files: a JSON array
+    (EmbIndex / data/index/meta.json) or JSON Lines (older build_index).
+    Returns the number of records written.
+    """
+    legacy_path = Path(legacy_path)
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            rows = json.load(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        with MetaStoreWriter(records_path) as w:
+            w.extend(rows)
+            return len(w)
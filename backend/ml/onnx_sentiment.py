@@ -0,0 +1,161 @@
+# ml/onnx_sentiment.py
+"""
+ONNX Runtime backend for the sentiment classifier (ml/sentiment_model.py).
+
+export_quantized() exports the HF sequence-classification model to ONNX
+once (dynamic batch / sequence axes), applies dynamic int8 quantization to
+its weights and caches the result on disk:
+
+  <cache_dir>/<model name>/
+      model.int8.onnx
+      tokenizer files
+      manifest.json     {"model", "id2label", "max_length", "quantization"}
+
+OnnxSentimentPipeline serves that file and is call-compatible with the HF
+pipeline the rest of the code uses: pipe(text) / pipe(texts, batch_size=n)
+-> [{"label", "score"}, ...]. Needs onnxruntime (+ torch / transformers /
+onnx for the one-time export); sentiment_model falls back to the torch
+pipeline when any of that is missing.
+"""
+
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+ONNX_FILE = "model.int8.onnx"
+MANIFEST = "manifest.json"
+OPSET = 14
+# longest input the exported graph gets; position embeddings stop at 512 for
+# the BERT-family models this is used with
+MAX_LENGTH = 512
+
+
+def _model_dir(model_name: str, cache_dir: Union[str, Path]) -> Path:
+    return Path(cache_dir) / model_name.replace("/", "--")
+
+
+def export_quantized(model_name: str, cache_dir: Union[str, Path]) -> Path:
+    """
+    Directory with the int8 ONNX export of `model_name`, exporting it first
+    if it isn't cached yet. The export is built in a temp dir and renamed
+    into place, so a crash never leaves a half-written cache entry.
+    """
+    out = _model_dir(model_name, cache_dir)
+    if (out / MANIFEST).exists():
+        return out
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=out.name + ".", dir=out.parent))
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        # two rows of different length, so batch and padding aren't traced
+        # as constants
+        sample = tokenizer(
+            ["export sample", "a somewhat longer export sample sentence"],
+            padding=True,
+            return_tensors="pt",
+        )
+        # graph inputs follow forward()'s parameter order, not the
+        # tokenizer's key order (BERT: input_ids, attention_mask,
+        # token_type_ids vs the tokenizer's input_ids, token_type_ids, ...),
+        # so name them in that order and pass them by keyword
+        names = [n for n in inspect.signature(model.forward).parameters if n in sample]
+        max_length = min(
+            MAX_LENGTH,
+            int(tokenizer.model_max_length),
+            int(getattr(model.config, "max_position_embeddings", MAX_LENGTH)),
+        )
+
+        fp32 = tmp / "model.onnx"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                # a trailing dict = keyword arguments
+                ({n: sample[n] for n in names},),
+                str(fp32),
+                input_names=names,
+                output_names=["logits"],
+                dynamic_axes={**{n: {0: "batch", 1: "seq"} for n in names}, "logits": {0: "batch"}},
+                opset_version=OPSET,
+            )
+        quantize_dynamic(str(fp32), str(tmp / ONNX_FILE), weight_type=QuantType.QInt8)
+        fp32.unlink()
+
+        tokenizer.save_pretrained(str(tmp))
+        with open(tmp / MANIFEST, "w", encoding="utf-8") as f:
+            json.dump({
+                "model": model_name,
+                "id2label": {str(k): v for k, v in model.config.id2label.items()},
+                "max_length": max_length,
+                "quantization": "dynamic-int8",
+            }, f)
+        try:
+            os.replace(tmp, out)
+        except OSError:
+            # another process finished the same export first
+            if not (out / MANIFEST).exists():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+class OnnxSentimentPipeline:
+    """HF-pipeline-shaped wrapper around an int8 ONNX Runtime session."""
+
+    def __init__(self, model_dir: Union[str, Path], intra_op_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        with open(model_dir / MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.model_name = manifest["model"]
+        self.id2label = {int(k): v for k, v in manifest["id2label"].items()}
+        # the tokenizer's model_max_length can be unset (a huge sentinel),
+        # which would let long reviews past the position embeddings
+        self.max_length = int(manifest.get("max_length", MAX_LENGTH))
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+        opts = ort.SessionOptions()
+        if intra_op_threads:
+            opts.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            str(model_dir / ONNX_FILE), sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _run(self, texts: List[str]) -> List[Dict[str, Any]]:
+        enc = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feed = {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs}
+        logits = self.session.run(["logits"], feed)[0]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        return [{"label": self.id2label[int(b)], "score": float(p[b])} for b, p in zip(best, probs)]
+
+    def __call__(self, inputs: Union[str, List[str]], batch_size: int = 1, **_: Any) -> List[Dict[str, Any]]:
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        step = max(1, batch_size)
+        out: List[Dict[str, Any]] = []
+        for i in range(0, len(texts), step):
+            out.extend(self._run(texts[i:i + step]))
+        return out
+
+
+def load_onnx_pipeline(model_name: str, cache_dir: Union[str, Path], intra_op_threads: int = 0) -> OnnxSentimentPipeline:
+    return OnnxSentimentPipeline(export_quantized(model_name, cache_dir), intra_op_threads=intra_op_threads)
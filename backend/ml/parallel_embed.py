@@ -0,0 +1,146 @@
+# ml/parallel_embed.py
+"""
+Multi-process embedding for index builds.
+
+One SentenceTransformer process tops out well below the machine on CPU:
+tokenization is single-threaded and torch's intra-op threads scale poorly
+past a few cores. ShardedEncoder starts N worker processes, each with its
+own model copy pinned to threads_per_worker threads, splits every batch of
+texts into N contiguous shards, embeds the shards in parallel and returns
+the vectors merged back in input order. The caller (build_index /
+EmbIndex.build) still writes one FAISS index and one metadata store, so
+nothing downstream knows the build was sharded.
+
+Workers use the "spawn" start method: forking a process that has already
+started torch / OpenMP threads can deadlock. Each worker loads its model on
+its first shard, not in the Pool initializer: an initializer that raises
+just gets the worker respawned forever, while an error in a task is raised
+from encode() and fails the build.
+"""
+
+import multiprocessing as mp
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# BLAS / OpenMP pools are sized when the library loads, i.e. when the worker
+# imports numpy to unpickle this module; so these go into the environment
+# the workers are spawned with, not set inside them
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+# spawned workers inherit os.environ; one pool start at a time edits it
+_spawn_lock = threading.Lock()
+
+# the worker's model name (set by _init_worker) and model (loaded on first shard)
+_model_name: Optional[str] = None
+_model = None
+
+
+def default_threads_per_worker(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+@contextmanager
+def _spawn_env(threads: int) -> Iterator[None]:
+    """os.environ as the workers should start with it, restored afterwards."""
+    env = {var: str(threads) for var in _THREAD_ENV}
+    # N processes each spawning tokenizer threads just oversubscribes the cores
+    env["TOKENIZERS_PARALLELISM"] = "false"
+    with _spawn_lock:
+        saved = {var: os.environ.get(var) for var in env}
+        os.environ.update(env)
+        try:
+            yield
+        finally:
+            for var, value in saved.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    # nothing here may raise (see module docstring)
+    global _model_name
+    _model_name = model_name
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+
+
+def _get_model():
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(_model_name)
+    return _model
+
+
+def _encode_shard(texts: List[str], batch_size: int) -> np.ndarray:
+    model = _get_model()
+    # length-sorted batches pad less; vectors go back in shard order
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vecs = model.encode(
+        [texts[i] for i in order],
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=False,
+    )
+    out = np.empty_like(vecs, dtype=np.float32)
+    out[order] = vecs
+    return out
+
+
+class ShardedEncoder:
+    """
+    encode(texts) -> (n, dim) float32, not normalized, in input order,
+    computed by `workers` processes. Usable as an encode_fn for
+    EmbeddingCache.encode. Close it (or use it as a context manager) to stop
+    the workers.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int,
+        threads_per_worker: Optional[int] = None,
+        batch_size: int = 64,
+    ):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(self.workers)
+        self.batch_size = batch_size
+        with _spawn_env(self.threads_per_worker):
+            self._pool = mp.get_context("spawn").Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(model_name, self.threads_per_worker),
+            )
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            raise ValueError("ShardedEncoder.encode needs at least one text")
+        n_shards = min(self.workers, len(texts))
+        bounds = np.linspace(0, len(texts), n_shards + 1).astype(int)
+        shards = [texts[bounds[i]:bounds[i + 1]] for i in range(n_shards)]
+        parts = self._pool.starmap(_encode_shard, [(s, self.batch_size) for s in shards])
+        return np.vstack(parts)
+
+    __call__ = encode
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,121 @@
+# ml/query_batcher.py
+"""
+Micro-batching for concurrent query embedding + ANN search.
+
+Every semantic search used to run its own `model.encode([query])` and its own
+`index.search`, i.e. one transformer forward pass with batch size 1 per
+request. QueryBatcher sits between the request threads and the model:
+
+  - callers submit() one item and block on its result
+  - a dispatcher thread takes the first waiting item, then keeps collecting
+    for up to `max_wait_ms` (or until `max_batch` items, or until every
+    caller currently inside submit() is in the batch), and hands the whole
+    list to `run_batch` in one call
+  - `run_batch(items) -> results` (same length, same order) does the batched
+    encode + search; result i goes back to caller i, an exception goes to
+    every caller of that batch
+
+A lone caller is dispatched straight away (nobody else to wait for), so
+light traffic doesn't pay the window; under load the window fills and
+throughput scales with batch size instead of request count.
+
+Used by services/semantic_index and ml/embed_index.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class QueryBatcher:
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch: int = 32,
+        max_wait_ms: float = 3.0,
+        name: str = "query-batcher",
+    ):
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # callers blocked in submit(); no point waiting for more than that
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+
+        self._counters = {"items": 0, "batches": 0, "max_batch_seen": 0}
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name=self.name, daemon=True)
+                t.start()
+                self._thread = t
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Queue `item` for the next batch and wait for its result.
+        """
+        self._ensure_started()
+        fut: Future = Future()
+        with self._inflight_lock:
+            self._inflight += 1
+        try:
+            self._queue.put((item, fut))
+            return fut.result(timeout=timeout)
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or len(batch) >= self._inflight:
+                    # window closed, or everyone waiting is already in the
+                    # batch: still take whatever is queued, but don't wait
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.run_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"run_batch returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+            self._counters["items"] += len(batch)
+            self._counters["batches"] += 1
+            self._counters["max_batch_seen"] = max(self._counters["max_batch_seen"], len(batch))
+
+    def stats(self) -> dict:
+        out = dict(self._counters)
+        out["mean_batch"] = round(out["items"] / out["batches"], 2) if out["batches"] else 0.0
+        out["queue_depth"] = self._queue.qsize()
+        return out
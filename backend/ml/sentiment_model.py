@@ -1,24 +1,252 @@
 # ml/sentiment_model.py
 
-from typing import List, Dict, Any, Tuple, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple, Optional
+import copy
+import hashlib
+import os
 import re
+import threading
+import time
+
+from .spacy_service import NOUN_CHUNKS, SPACY_MODEL, get_spacy_service
+
+if TYPE_CHECKING:
+    from spacy.tokens import Span, Doc
 
 ########################################
-# 1. Sentiment model (overall sentiment + fallback heuristic)
+# 0. Inference cache (predict_sentiment* + aspect_breakdown*)
 ########################################
 
-# We try to load a transformer sentiment pipeline at import time.
-# If that fails (no internet / no weights), we fall back to a tiny heuristic.
-from transformers import pipeline
+# entries across both kinds; 0 disables the cache
+INFERENCE_CACHE_SIZE = int(os.getenv("INFERENCE_CACHE_SIZE", "20000"))
+
+
+def _normalize_text(text: str) -> str:
+    # whitespace runs don't change either model's output (the HF tokenizer
+    # splits on whitespace; aspect_breakdown parses the normalized text)
+    return " ".join(text.split())
+
+
+class InferenceCache:
+    """
+    Process-wide bounded LRU of inference results, keyed by
+    sha1(kind + model id + normalized text). Values are deep-copied on the
+    way in and out so callers can't mutate a cached result.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[bytes, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(kind: str, model_id: str, normalized: str) -> bytes:
+        return hashlib.sha1(f"{kind}\0{model_id}\0{normalized}".encode("utf-8")).digest()
+
+    def get(self, key: bytes) -> Optional[Any]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key: bytes, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = InferenceCache(INFERENCE_CACHE_SIZE)
 
-_hf_pipeline = None
-try:
-    _hf_pipeline = pipeline(
+
+def inference_cache_stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+
+def clear_inference_cache() -> None:
+    _cache.clear()
+
+
+########################################
+# 1. Models, loaded lazily (first use or warmup())
+########################################
+
+# Nothing heavy happens at import time, so importing this module (every
+# route that uses it) stays cheap; the first request or warmup() pays for
+# each load once, behind a lock. If the HF pipeline can't load (no
+# transformers / weights / internet) we fall back to a tiny heuristic, and
+# model_status() says so.
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+
+
+class _LazyModel:
+    """Loads `loader()` once, thread-safely, recording load time / error."""
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.value = None
+        self.load_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def get(self):
+        if self._loaded:
+            return self.value
+        with self._lock:
+            if not self._loaded:
+                t0 = time.perf_counter()
+                try:
+                    self.value = self._loader()
+                except Exception as e:
+                    self.value = None
+                    self.error = f"{type(e).__name__}: {e}"
+                self.load_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+                self._loaded = True
+        return self.value
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self._loaded,
+            "available": self.value is not None,
+            "load_ms": self.load_ms,
+            "error": self.error,
+        }
+
+
+# "torch" = HF pipeline; "onnx" = int8-quantized ONNX Runtime export
+# (ml/onnx_sentiment.py, exported once into ONNX_CACHE_DIR), falling back to
+# torch if it can't be exported / loaded
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch").lower()
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "/data/onnx")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+# which backend actually loaded, and why "onnx" wasn't it
+_backend: Dict[str, Optional[str]] = {"name": None, "fallback_reason": None}
+
+
+def _load_pipeline():
+    if SENTIMENT_BACKEND == "onnx":
+        try:
+            from .onnx_sentiment import load_onnx_pipeline
+            pipe = load_onnx_pipeline(SENTIMENT_MODEL, ONNX_CACHE_DIR, intra_op_threads=ONNX_THREADS)
+            _backend["name"] = "onnx-int8"
+            return pipe
+        except Exception as e:
+            _backend["fallback_reason"] = f"{type(e).__name__}: {e}"
+
+    from transformers import pipeline
+    pipe = pipeline(
         "sentiment-analysis",
-        model="distilbert-base-uncased-finetuned-sst-2-english",
+        model=SENTIMENT_MODEL,
     )
-except Exception:
-    _hf_pipeline = None
+    _backend["name"] = "torch"
+    return pipe
+
+
+def _load_spacy():
+    # You must have this in requirements.txt:
+    #   spacy
+    #   en-core-web-sm @ https://github.com/explosion/spacy-models/releases/download/en_core_web_sm-3.7.1/en_core_web_sm-3.7.1.tar.gz
+    #
+    # and ensure Docker installs it. Only the noun-chunk components are
+    # loaded (ml/spacy_service.py).
+    return get_spacy_service().nlp(NOUN_CHUNKS)
+
+
+_sentiment_model = _LazyModel("sentiment", _load_pipeline)
+_spacy_model = _LazyModel("spacy", _load_spacy)
+_warm = threading.Event()
+
+
+def _hf():
+    return _sentiment_model.get()
+
+
+def _nlp():
+    nlp = _spacy_model.get()
+    if nlp is None:
+        raise RuntimeError(f"spaCy model {SPACY_MODEL} unavailable: {_spacy_model.error}")
+    return nlp
+
+
+def _sentiment_id() -> str:
+    # part of every cache key, so a fallback-heuristic result is never served
+    # once the model is back (and vice versa), nor int8 scores as fp32 ones
+    return f"{SENTIMENT_MODEL}+{_backend['name']}" if _hf() is not None else "heuristic"
+
+
+def warmup() -> Dict[str, Any]:
+    """
+    Load both models and run one tiny inference through each, so the first
+    real request doesn't pay for it. Idempotent (cheap once warm). Called at
+    app startup and by /health?deep=1. Returns model_status().
+    """
+    hf = _hf()
+    if hf is not None:
+        try:
+            hf("warm up")
+        except Exception as e:
+            _sentiment_model.error = f"{type(e).__name__}: {e}"
+    nlp = _spacy_model.get()
+    if nlp is not None:
+        nlp("warm up")
+    _warm.set()
+    return model_status()
+
+
+def is_ready() -> bool:
+    """True once warmup() has run (models loaded, or their failure recorded)."""
+    return _warm.is_set()
+
+
+def model_status() -> Dict[str, Any]:
+    sentiment = _sentiment_model.status()
+    sentiment["model"] = SENTIMENT_MODEL
+    # "torch" / "onnx-int8", or "heuristic" = no model could load and answers are word-list based
+    sentiment["backend"] = _backend["name"] if sentiment["available"] else ("heuristic" if sentiment["loaded"] else None)
+    sentiment["requested_backend"] = SENTIMENT_BACKEND
+    sentiment["fallback_reason"] = _backend["fallback_reason"]
+    spacy_status = _spacy_model.status()
+    spacy_status["model"] = SPACY_MODEL
+    return {
+        "ready": is_ready(),
+        "degraded": sentiment["backend"] == "heuristic" or (spacy_status["loaded"] and not spacy_status["available"]),
+        "sentiment": sentiment,
+        "spacy": spacy_status,
+    }
 
 
 _POS_WORDS = {
@@ -56,6 +284,27 @@ def _heuristic_sentiment(text: str) -> Dict[str, Any]:
     return {"label": label, "score": float(min(1.0, max(0.0, confidence)))}
 
 
+# contexts per HF forward pass in predict_sentiment_many (padded to the longest)
+SENTIMENT_BATCH_SIZE = 32
+
+
+def _from_hf(item: Dict[str, Any]) -> Dict[str, Any]:
+    # Usually looks like {'label': 'POSITIVE', 'score': 0.998...}
+    label = item.get("label", "NEUTRAL")
+    score = float(item.get("score", 0.0))
+    # Normalize to POSITIVE / NEGATIVE / NEUTRAL
+    # HF SST-2 is binary, so if it's neither pos nor neg explicitly,
+    # treat as neutral
+    up = label.upper()
+    if "POS" in up:
+        final_label = "POSITIVE"
+    elif "NEG" in up:
+        final_label = "NEGATIVE"
+    else:
+        final_label = "NEUTRAL"
+    return {"label": final_label, "score": score}
+
+
 def predict_sentiment(text: str) -> Dict[str, Any]:
     """
     Public: returns {"label": "POSITIVE"/"NEGATIVE"/"NEUTRAL", "score": float}
@@ -65,54 +314,114 @@ def predict_sentiment(text: str) -> Dict[str, Any]:
     - explain_model.token_attributions()
     - explain_model.analyze_aspects() fallback
     """
-    cleaned = text.strip()
+    cleaned = _normalize_text(text)
     if not cleaned:
         return {"label": "NEUTRAL", "score": 0.0}
 
-    if _hf_pipeline is not None:
+    hf = _hf()
+    key = InferenceCache.key("sentiment", _sentiment_id(), cleaned)
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit
+
+    if hf is not None:
         try:
-            res = _hf_pipeline(cleaned)
-            # Usually looks like [{'label': 'POSITIVE', 'score': 0.998...}]
+            res = hf(cleaned, truncation=True)
             if isinstance(res, list) and len(res) > 0:
-                item = res[0]
-                label = item.get("label", "NEUTRAL")
-                score = float(item.get("score", 0.0))
-                # Normalize to POSITIVE / NEGATIVE / NEUTRAL
-                # HF SST-2 is binary, so if it's neither pos nor neg explicitly,
-                # treat as neutral
-                up = label.upper()
-                if "POS" in up:
-                    final_label = "POSITIVE"
-                elif "NEG" in up:
-                    final_label = "NEGATIVE"
-                else:
-                    final_label = "NEUTRAL"
-                return {"label": final_label, "score": score}
+                out = _from_hf(res[0])
+                _cache.put(key, out)
+                return out
         except Exception:
-            # fall through to heuristic
-            pass
+            # fall through to heuristic (not cached: the model is meant to answer)
+            return _heuristic_sentiment(cleaned)
 
     # fallback heuristic
-    return _heuristic_sentiment(cleaned)
+    out = _heuristic_sentiment(cleaned)
+    if hf is None:
+        _cache.put(key, out)
+    return out
+
+
+def predict_sentiment_many(
+    texts: List[str],
+    batch_size: int = SENTIMENT_BATCH_SIZE,
+    stats: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    predict_sentiment() for a list of texts, in order, with the HF model run
+    over padded batches of batch_size instead of one forward pass per text.
+    Identical texts are only scored once, and texts in the inference cache
+    not at all. If given, `stats` gets "sequences" (texts actually scored),
+    "forward_passes" (HF calls, including per-text retries after a failed
+    batch) and "failed" (texts that fell back to the heuristic because the
+    loaded model raised on them).
+    """
+    hf = _hf()
+    model_id = _sentiment_id()
+    out: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    todo: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        cleaned = _normalize_text(text)
+        if not cleaned:
+            out[i] = {"label": "NEUTRAL", "score": 0.0}
+        elif cleaned in todo:
+            todo[cleaned].append(i)
+        else:
+            todo[cleaned] = [i]
+            # None on a miss; duplicates later in `texts` copy out[i]
+            out[i] = _cache.get(InferenceCache.key("sentiment", model_id, cleaned))
+
+    unique = [t for t, pos in todo.items() if out[pos[0]] is None]
+
+    # texts from unrelated callers (e.g. batched /model/predict requests) share
+    # these passes, so one bad input must not change the others' answers:
+    # long texts are truncated to the model max, and a failed batch is retried
+    # text by text; only texts that fail alone get the heuristic
+    results: List[Optional[Dict[str, Any]]] = [None] * len(unique)
+    passes = failed = 0
+    if hf is not None:
+        for start in range(0, len(unique), batch_size):
+            chunk = unique[start:start + batch_size]
+            try:
+                res = hf(chunk, batch_size=batch_size, truncation=True)
+                passes += 1
+            except Exception:
+                res = None
+            if isinstance(res, list) and len(res) == len(chunk):
+                results[start:start + len(chunk)] = [_from_hf(item) for item in res]
+                continue
+            for j, t in enumerate(chunk):
+                try:
+                    res = hf(t, truncation=True)
+                    passes += 1
+                    results[start + j] = _from_hf(res[0])
+                except Exception:
+                    failed += 1
+    if stats is not None:
+        stats["sequences"] = stats.get("sequences", 0) + len(unique)
+        stats["forward_passes"] = stats.get("forward_passes", 0) + passes
+        stats["failed"] = stats.get("failed", 0) + failed
+    for cleaned, res in zip(unique, results):
+        # heuristic answers aren't cached when the model is loaded but failed
+        cacheable = res is not None or hf is None
+        if res is None:
+            res = _heuristic_sentiment(cleaned)
+        out[todo[cleaned][0]] = res
+        if cacheable:
+            _cache.put(InferenceCache.key("sentiment", model_id, cleaned), res)
+
+    for positions in todo.values():
+        for i in positions[1:]:
+            out[i] = dict(out[positions[0]])
+    return out
 
 
 ########################################
 # 2. ABSA via spaCy noun chunks + local sentiment window
 ########################################
 
-import spacy
-from spacy.tokens import Span, Doc
-
-# Load spaCy English model once.
-# You must have this in requirements.txt:
-#   spacy
-#   en-core-web-sm @ https://github.com/explosion/spacy-models/releases/download/en_core_web_sm-3.7.1/en_core_web_sm-3.7.1.tar.gz
-#
-# and ensure Docker installs it.
-_nlp = spacy.load("en_core_web_sm")
-
 
-def _normalize_aspect_text(span: Span) -> str:
+def _normalize_aspect_text(span: "Span") -> str:
     """
     Turn noun chunk into a nice label for display:
     - lowercase
@@ -125,7 +434,7 @@ def _normalize_aspect_text(span: Span) -> str:
     return txt
 
 
-def _window_for_span(doc: Doc, span: Span, window_size: int = 6) -> str:
+def _window_for_span(doc: "Doc", span: "Span", window_size: int = 6) -> str:
     """
     Build a sentiment context window around a noun chunk:
     tokens [span.start-window_size : span.end+window_size]
@@ -136,6 +445,29 @@ def _window_for_span(doc: Doc, span: Span, window_size: int = 6) -> str:
     return " ".join(window_tokens)
 
 
+def _pick_aspects(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Deduplicate by aspect label with priority: negative > positive > neutral.
+    best_for_aspect: Dict[str, Dict[str, Any]] = {}
+    priority = {"negative": 3, "positive": 2, "neutral": 1}
+
+    for info in candidates:
+        aspect_label = info["aspect"]
+        prev = best_for_aspect.get(aspect_label)
+        if prev is None:
+            best_for_aspect[aspect_label] = info
+        else:
+            prev_sent = prev["sentiment"]
+            new_sent = info["sentiment"]
+            if priority.get(new_sent, 0) > priority.get(prev_sent, 0):
+                best_for_aspect[aspect_label] = info
+            elif new_sent == prev_sent:
+                # tie: keep higher confidence
+                if info["score"] > prev["score"]:
+                    best_for_aspect[aspect_label] = info
+
+    return list(best_for_aspect.values())
+
+
 def aspect_breakdown(text: str) -> List[Dict[str, Any]]:
     """
     Return a list of aspect dicts:
@@ -152,55 +484,69 @@ def aspect_breakdown(text: str) -> List[Dict[str, Any]]:
     Steps:
     1. Extract noun chunks with spaCy.
     2. For each chunk, grab a local +/- 6-token context window.
-    3. Run predict_sentiment(context_window).
+    3. Score all context windows in one batched pass (predict_sentiment_many).
     4. Deduplicate aspects, preferring the strongest polarity:
        - negative > positive > neutral
        - tie-breaker = higher confidence score.
     """
-    if not text or not text.strip():
-        return []
-
-    doc = _nlp(text)
+    return aspect_breakdown_many([text])[0]
 
-    candidates: List[Tuple[str, Dict[str, Any]]] = []
 
-    for chunk in doc.noun_chunks:
-        aspect_label = _normalize_aspect_text(chunk)
-        if not aspect_label:
-            continue
-
-        context_window = _window_for_span(doc, chunk, window_size=6)
-
-        sent_res = predict_sentiment(context_window)
-        polarity = sent_res["label"].lower()  # "positive"/"negative"/"neutral"
-        conf = float(sent_res["score"])
-
-        candidates.append((
-            aspect_label,
-            {
-                "aspect": aspect_label,
-                "sentiment": polarity,
-                "score": conf,
-                "context": context_window,
-            }
-        ))
-
-    # Deduplicate by aspect_label with priority: negative > positive > neutral.
-    best_for_aspect: Dict[str, Dict[str, Any]] = {}
-    priority = {"negative": 3, "positive": 2, "neutral": 1}
-
-    for aspect_label, info in candidates:
-        prev = best_for_aspect.get(aspect_label)
-        if prev is None:
-            best_for_aspect[aspect_label] = info
+def aspect_breakdown_many(texts: List[str], batch_size: int = SENTIMENT_BATCH_SIZE) -> List[List[Dict[str, Any]]]:
+    """
+    aspect_breakdown() for many documents, in order (for ingest / backfills).
+    Documents are whitespace-normalized; ones in the inference cache skip
+    spaCy and the model. The rest are parsed in nlp.pipe batches by the
+    parser-only pipeline (ml/spacy_service.py) and the context
+    windows of all of them go through the sentiment model together,
+    batch_size per forward pass.
+    """
+    model_id = f"{_sentiment_id()}+{SPACY_MODEL}"
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(texts)
+    todo: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        norm = _normalize_text(text or "")
+        if not norm:
+            results[i] = []
+        elif norm in todo:
+            todo[norm].append(i)
         else:
-            prev_sent = prev["sentiment"]
-            new_sent = info["sentiment"]
-            if priority.get(new_sent, 0) > priority.get(prev_sent, 0):
-                best_for_aspect[aspect_label] = info
-            elif new_sent == prev_sent:
-                # tie: keep higher confidence
-                if info["score"] > prev["score"]:
-                    best_for_aspect[aspect_label] = info
-
-    return list(best_for_aspect.values())
+            todo[norm] = [i]
+            results[i] = _cache.get(InferenceCache.key("aspects", model_id, norm))
+
+    docs = [norm for norm, pos in todo.items() if results[pos[0]] is None]
+    windows: List[Tuple[int, str, str]] = []  # (position in docs, aspect label, context window)
+
+    if docs:
+        _nlp()  # raises if spaCy couldn't load
+    for d, doc in enumerate(get_spacy_service().pipe(docs, NOUN_CHUNKS) if docs else []):
+        for chunk in doc.noun_chunks:
+            aspect_label = _normalize_aspect_text(chunk)
+            if not aspect_label:
+                continue
+            windows.append((d, aspect_label, _window_for_span(doc, chunk, window_size=6)))
+
+    cost: Dict[str, int] = {}
+    preds = predict_sentiment_many([w for _, _, w in windows], batch_size=batch_size, stats=cost)
+    # some window fell back to the heuristic while the model was loaded: don't cache
+    cacheable = not cost.get("failed")
+
+    candidates: List[List[Dict[str, Any]]] = [[] for _ in docs]
+    for (d, aspect_label, context_window), sent_res in zip(windows, preds):
+        candidates[d].append({
+            "aspect": aspect_label,
+            "sentiment": sent_res["label"].lower(),  # "positive"/"negative"/"neutral"
+            "score": float(sent_res["score"]),
+            "context": context_window,
+        })
+
+    for norm, cands in zip(docs, candidates):
+        aspects = _pick_aspects(cands)
+        results[todo[norm][0]] = aspects
+        if cacheable:
+            _cache.put(InferenceCache.key("aspects", model_id, norm), aspects)
+
+    for positions in todo.values():
+        for i in positions[1:]:
+            results[i] = copy.deepcopy(results[positions[0]])
+    return results
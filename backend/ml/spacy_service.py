@@ -0,0 +1,134 @@
+# ml/spacy_service.py
+"""
+One place that owns the spaCy pipelines.
+
+Callers only need part of en_core_web_sm: aspect_breakdown reads
+noun_chunks (tagger + attribute_ruler for POS, parser for deps), ABSA reads
+doc.ents (ner). Each profile loads the model once with everything else
+excluded, so those components are neither loaded nor run, and documents go
+through nlp.pipe in batches instead of one nlp(text) call each.
+
+  SPACY_MODEL       model package (default en_core_web_sm)
+  SPACY_BATCH_SIZE  docs per nlp.pipe batch (default 64)
+  SPACY_N_PROCESS   worker processes for nlp.pipe (default 1); only used
+                    for calls with at least SPACY_MP_MIN_DOCS docs, since
+                    starting the workers costs more than small batches save
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "64"))
+SPACY_N_PROCESS = int(os.getenv("SPACY_N_PROCESS", "1"))
+SPACY_MP_MIN_DOCS = int(os.getenv("SPACY_MP_MIN_DOCS", "2000"))
+
+NOUN_CHUNKS = "noun_chunks"
+NER = "ner"
+# profile -> en_core_web_sm components excluded at load time (not loaded, not run)
+PROFILES: Dict[str, List[str]] = {
+    NOUN_CHUNKS: ["ner", "lemmatizer"],
+    NER: ["tagger", "parser", "attribute_ruler", "lemmatizer"],
+    "full": [],
+}
+
+
+class SpacyService:
+    """
+    Lazily loaded spaCy pipeline per profile, plus per-profile throughput
+    counters (stats()). Thread-safe; the loaded pipelines are shared.
+    """
+
+    def __init__(
+        self,
+        model: str = SPACY_MODEL,
+        batch_size: int = SPACY_BATCH_SIZE,
+        n_process: int = SPACY_N_PROCESS,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self._lock = threading.Lock()
+        self._nlps: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def nlp(self, profile: str):
+        """The pipeline for `profile`, loading it on first use."""
+        nlp = self._nlps.get(profile)
+        if nlp is not None:
+            return nlp
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown spaCy profile: {profile}")
+        with self._lock:
+            nlp = self._nlps.get(profile)
+            if nlp is None:
+                import spacy
+                t0 = time.perf_counter()
+                nlp = spacy.load(self.model, exclude=PROFILES[profile])
+                self._nlps[profile] = nlp
+                self._stats[profile] = {
+                    "load_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+                    "docs": 0,
+                    "seconds": 0.0,
+                }
+        return nlp
+
+    def pipe(
+        self,
+        texts: Iterable[str],
+        profile: str,
+        batch_size: Optional[int] = None,
+        n_process: Optional[int] = None,
+    ) -> Iterator[Any]:
+        """Docs for `texts`, in order, through nlp.pipe."""
+        nlp = self.nlp(profile)
+        texts = texts if isinstance(texts, list) else list(texts)
+        if n_process is None:
+            n_process = self.n_process if len(texts) >= SPACY_MP_MIN_DOCS else 1
+        t0 = time.perf_counter()
+        n = 0
+        try:
+            for doc in nlp.pipe(texts, batch_size=batch_size or self.batch_size, n_process=n_process):
+                n += 1
+                yield doc
+        finally:
+            # includes time the caller spent between docs; fine for docs/sec trends
+            self._count(profile, n, time.perf_counter() - t0)
+
+    def parse(self, text: str, profile: str):
+        """One doc; for batches use pipe()."""
+        nlp = self.nlp(profile)
+        t0 = time.perf_counter()
+        doc = nlp(text)
+        self._count(profile, 1, time.perf_counter() - t0)
+        return doc
+
+    def _count(self, profile: str, docs: int, seconds: float) -> None:
+        with self._lock:
+            st = self._stats[profile]
+            st["docs"] += docs
+            st["seconds"] += seconds
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            out = {name: dict(st) for name, st in self._stats.items()}
+        for name, st in out.items():
+            st["components"] = list(self._nlps[name].pipe_names)
+            st["docs_per_s"] = round(st["docs"] / st["seconds"], 1) if st["seconds"] > 0 else 0.0
+            st["seconds"] = round(st["seconds"], 3)
+        return out
+
+
+_service: Optional[SpacyService] = None
+_service_lock = threading.Lock()
+
+
+def get_spacy_service() -> SpacyService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = SpacyService()
+    return _service
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Recall / latency / size benchmark for the FAISS index types in ml/ann_index.py.
+
+Builds each index type (Flat, IVF-Flat, HNSW and the compressed fp16, sq8,
+IVF-PQ encodings) over the same corpus, then for each search knob setting
+(nprobe for IVF*, efSearch for HNSW) reports:
+  - recall@k against the exact (uncompressed) Flat results, and the loss
+  - p50 / p99 single-query latency
+  - bytes per vector of the serialized index
+  - build (train + add) time
+
+Corpus: vectors reconstructed from an existing flat index (--from-index,
+default: the served index.faiss) or synthetic clustered vectors (--synthetic N).
+
+Run from backend/:
+  PYTHONPATH=. python scripts/bench_ann_index.py --synthetic 200000 --k 10
+"""
+import argparse
+import time
+from typing import List
+
+import numpy as np
+import faiss  # type: ignore
+
+from core.config import settings
+from ml.ann_index import INDEX_TYPES, build_trained, bytes_per_vector, describe, search_params
+from ml.index_versions import active_dir
+
+
+def _load_corpus(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(max(1, args.synthetic // 500), args.dim)).astype("float32")
+        assign = rng.integers(0, len(centers), size=args.synthetic)
+        xb = centers[assign] + 0.3 * rng.normal(size=(args.synthetic, args.dim)).astype("float32")
+    else:
+        flat = faiss.read_index(args.from_index or str(active_dir(settings.index_dir) / "index.faiss"))
+        xb = flat.reconstruct_n(0, flat.ntotal)
+    xb = np.ascontiguousarray(xb, dtype="float32")
+    faiss.normalize_L2(xb)
+    return xb
+
+
+def _latencies(index, xq: np.ndarray, k: int, params) -> List[float]:
+    out = []
+    for i in range(len(xq)):
+        t0 = time.perf_counter()
+        index.search(xq[i:i + 1], k, params=params)
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return sorted(out)
+
+
+def _recall(truth: np.ndarray, got: np.ndarray, k: int) -> float:
+    hits = 0
+    for t, g in zip(truth, got):
+        hits += len(set(t[:k]) & set(g[:k]))
+    return hits / (len(truth) * k)
+
+
+def _report(name: str, knob: str, index, xq, k, truth, params, build_s: float):
+    _, got = index.search(xq, k, params=params)
+    lat = _latencies(index, xq, k, params)
+    p50 = lat[len(lat) // 2]
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+    recall = _recall(truth, got, k)
+    print(
+        f"{name:<6} {knob:<14} {recall:>9.4f} {1.0 - recall:>7.4f} "
+        f"{p50:>8.3f} {p99:>8.3f} {bytes_per_vector(index):>9.1f} {build_s:>8.1f}"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--from-index", default=None, help="flat index to take vectors from")
+    ap.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nlist", type=int, default=settings.index_nlist)
+    ap.add_argument("--hnsw-m", type=int, default=settings.index_hnsw_m)
+    ap.add_argument("--pq-m", type=int, default=settings.index_pq_m)
+    ap.add_argument("--pq-nbits", type=int, default=settings.index_pq_nbits)
+    ap.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    args = ap.parse_args()
+
+    xb = _load_corpus(args)
+    # held-out queries: perturbed copies of random corpus vectors
+    rng = np.random.default_rng(1)
+    pick = rng.choice(len(xb), size=min(args.queries, len(xb)), replace=False)
+    xq = xb[pick] + 0.05 * rng.normal(size=(len(pick), xb.shape[1])).astype("float32")
+    xq = np.ascontiguousarray(xq, dtype="float32")
+    faiss.normalize_L2(xq)
+
+    print(f"corpus={len(xb)} dim={xb.shape[1]} queries={len(xq)} k={args.k}")
+    print(
+        f"{'type':<6} {'knob':<14} {'recall@k':>9} {'loss':>7} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'B/vec':>9} {'build s':>8}"
+    )
+
+    # exact ground truth, always from the uncompressed flat index
+    truth_index = build_trained(xb, "flat")
+    truth_index.add(xb)
+    _, truth = truth_index.search(xq, args.k)
+
+    for index_type in args.types:
+        t0 = time.perf_counter()
+        index = build_trained(
+            xb, index_type, nlist=args.nlist, hnsw_m=args.hnsw_m,
+            pq_m=args.pq_m, pq_nbits=args.pq_nbits,
+        )
+        index.add(xb)
+        build_s = time.perf_counter() - t0
+
+        if index_type in ("ivf", "ivfpq"):
+            print(f"# {describe(index)} nlist={faiss.extract_index_ivf(index).nlist}")
+            for nprobe in args.nprobe:
+                params = search_params(index, nprobe=nprobe)
+                _report(index_type, f"nprobe={nprobe}", index, xq, args.k, truth, params, build_s)
+        elif index_type == "hnsw":
+            for ef in args.ef_search:
+                params = search_params(index, ef_search=ef)
+                _report("hnsw", f"efSearch={ef}", index, xq, args.k, truth, params, build_s)
+        else:
+            _report(index_type, "-", index, xq, args.k, truth, None, build_s)
+
+
+if __name__ == "__main__":
+    main()
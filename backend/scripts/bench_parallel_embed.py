@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Embedding throughput vs number of worker processes (ml/parallel_embed.py),
+i.e. what index_build_workers / EMB_BUILD_WORKERS buy on this machine.
+
+Embeds the same `--rows` synthetic review texts with the in-process model
+(baseline) and then with ShardedEncoder at each `--workers` count
+(threads per worker = cores / workers unless --threads is given). Reports:
+  - rows/sec
+  - speedup over the in-process baseline
+  - parallel efficiency (speedup / workers)
+Worker start-up (model load) is excluded, same as a long build amortises it.
+
+Run from backend/:
+  PYTHONPATH=. python scripts/bench_parallel_embed.py --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import time
+from typing import List
+
+from core.config import settings
+from ml.parallel_embed import ShardedEncoder, default_threads_per_worker
+
+WORDS = [
+    "battery", "screen", "side", "effects", "headache", "price", "sound",
+    "charger", "nausea", "delivery", "quality", "dosage", "keyboard",
+    "works", "great", "stopped", "working", "would", "not", "recommend",
+    "sleep", "after", "two", "weeks", "the", "and", "it", "my", "doctor",
+]
+
+
+def _texts(n: int) -> List[str]:
+    rng = random.Random(0)
+    # review-like length spread: a few words up to a long paragraph
+    return [" ".join(rng.choices(WORDS, k=rng.randint(5, 120))) for _ in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--rows", type=int, default=8192)
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--chunk", type=int, default=2048, help="rows per encode() call, as in build_index")
+    ap.add_argument("--threads", type=int, default=0, help="threads per worker (0 = cores / workers)")
+    args = ap.parse_args()
+
+    texts = _texts(args.rows)
+    cores = os.cpu_count() or 1
+    print(f"model={settings.emb_model} rows={args.rows} cores={cores}")
+    print(f"{'workers':>7} {'threads':>7} {'rows/s':>9} {'speedup':>8} {'eff':>6}")
+
+    # baseline: one process, model in this process, all cores for torch
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(settings.emb_model)
+    model.encode(texts[:64], batch_size=args.batch_size)
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), args.chunk):
+        model.encode(texts[i:i + args.chunk], batch_size=args.batch_size, convert_to_numpy=True)
+    base = args.rows / (time.perf_counter() - t0)
+    print(f"{'inproc':>7} {cores:>7} {base:>9.1f} {1.0:>8.2f} {'-':>6}")
+    del model
+
+    for workers in args.workers:
+        threads = args.threads or default_threads_per_worker(workers)
+        with ShardedEncoder(settings.emb_model, workers, threads, batch_size=args.batch_size) as enc:
+            # warm-up: workers load their model copies before the timed run
+            enc(texts[:workers * 8])
+            t0 = time.perf_counter()
+            for i in range(0, len(texts), args.chunk):
+                enc(texts[i:i + args.chunk])
+            rate = args.rows / (time.perf_counter() - t0)
+        speedup = rate / base
+        print(f"{workers:>7} {threads:>7} {rate:>9.1f} {speedup:>8.2f} {speedup / workers:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
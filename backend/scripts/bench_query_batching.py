@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Throughput / latency of concurrent semantic searches with and without query
+micro-batching (ml/query_batcher.py).
+
+Loads the SemanticIndex from settings.index_dir once, then for each
+concurrency level runs `--requests` searches spread over that many client
+threads, first with one encode + search per query, then batched
+(window --wait-ms, at most --max-batch queries). Reports:
+  - queries/sec
+  - p50 / p99 end-to-end latency per query
+  - mean batch size the batcher actually formed
+
+Run from backend/:
+  PYTHONPATH=. python scripts/bench_query_batching.py --concurrency 1 4 16 64
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from core.config import settings
+from ml.query_batcher import QueryBatcher
+from services.semantic_index import SemanticIndex
+
+QUERY_WORDS = [
+    "battery", "screen", "side effects", "headache", "price", "sound",
+    "charger", "nausea", "delivery", "quality", "dosage", "keyboard",
+    "works great", "stopped working", "would not recommend", "sleep",
+]
+
+
+def _queries(n: int) -> List[str]:
+    rng = random.Random(0)
+    return [" ".join(rng.sample(QUERY_WORDS, 3)) for _ in range(n)]
+
+
+def _run(sem: SemanticIndex, queries: List[str], concurrency: int, k: int):
+    lat: List[float] = []
+
+    def one(q: str):
+        t0 = time.perf_counter()
+        sem.search(q, top_k=k)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return len(queries) / wall, lat[len(lat) // 2], lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--requests", type=int, default=512, help="searches per run")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--max-batch", type=int, default=settings.query_batch_max)
+    ap.add_argument("--wait-ms", type=float, default=settings.query_batch_wait_ms)
+    args = ap.parse_args()
+
+    sem = SemanticIndex()
+    queries = _queries(args.requests)
+    print(f"index={sem.index_path} ntotal={sem.ntotal} requests={args.requests} k={args.k}")
+    print(f"{'mode':<10} {'clients':>7} {'qps':>9} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+
+    # warm the model / caches once
+    sem.batcher = None
+    _run(sem, queries[:16], 1, args.k)
+
+    for concurrency in args.concurrency:
+        sem.batcher = None
+        qps, p50, p99 = _run(sem, queries, concurrency, args.k)
+        print(f"{'single':<10} {concurrency:>7} {qps:>9.1f} {p50:>8.2f} {p99:>8.2f} {'1':>6}")
+
+        batcher: Optional[QueryBatcher] = QueryBatcher(
+            sem._search_many, max_batch=args.max_batch, max_wait_ms=args.wait_ms
+        )
+        sem.batcher = batcher
+        qps, p50, p99 = _run(sem, queries, concurrency, args.k)
+        mean_batch = batcher.stats()["mean_batch"]
+        print(f"{'batched':<10} {concurrency:>7} {qps:>9.1f} {p50:>8.2f} {p99:>8.2f} {mean_batch:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Contention benchmark for the in-memory review store + lexical search.
+
+Runs a mixed ingest/search workload with 1, 4 and 16 concurrent clients
+against:
+  - single-lock: one threading.Lock around one list + one inverted index
+                 (how state_store / lightweight_search used to work)
+  - sharded:     services.state_store.ShardedReviewStore + per-shard
+                 RWLock'd indexes (what /search and /ingest use now)
+Both sides rank with Jaccard so only the locking differs.
+
+Run from backend/:
+  PYTHONPATH=. python scripts/bench_review_store.py --seed-docs 20000 --seconds 3
+"""
+import argparse
+import random
+import threading
+import time
+from threading import Lock
+from typing import Callable, List
+
+from services.lightweight_search import (
+    InvertedIndex,
+    _score,
+    _tokenize_simple,
+    add_review_text_for_search,
+    search_similar,
+)
+
+WORDS = (
+    "battery life screen camera sharp slow fast overheats speaker sound "
+    "great terrible nausea headache dizzy relief works broke charging "
+    "price shipping quality recommend awful love hate the is and it"
+).split()
+
+
+def _random_review(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+
+
+class _SingleLockBaseline:
+    def __init__(self):
+        self.lock = Lock()
+        self.rows: List[dict] = []
+        self.index = InvertedIndex()
+
+    def add(self, text: str):
+        tokens = _tokenize_simple(text)
+        with self.lock:
+            doc_id = len(self.rows)
+            self.rows.append({"text": text})
+            self.index.add(doc_id, tokens)
+
+    def search(self, query: str, k: int = 5):
+        q_terms = set(_tokenize_simple(query))
+        with self.lock:
+            scored = []
+            for doc_id, inter in self.index.overlap(q_terms).items():
+                s = _score(inter, len(q_terms), self.index.distinct_terms(doc_id))
+                scored.append((-round(s, 3), doc_id, self.rows[doc_id]["text"]))
+            scored.sort()
+            return scored[:k]
+
+
+def _run(clients: int, seconds: float, write_ratio: float,
+         add: Callable[[str], None], search: Callable[[str], object]):
+    stop = time.perf_counter() + seconds
+    ops = [0] * clients
+    lat: List[List[float]] = [[] for _ in range(clients)]
+
+    def worker(i: int):
+        rng = random.Random(i)
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            if rng.random() < write_ratio:
+                add(_random_review(rng))
+            else:
+                search(" ".join(rng.choice(WORDS) for _ in range(3)))
+            lat[i].append(time.perf_counter() - t0)
+            ops[i] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    t_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t_start
+
+    all_lat = sorted(x for per in lat for x in per)
+    p50 = all_lat[len(all_lat) // 2] * 1000 if all_lat else 0.0
+    p99 = all_lat[int(len(all_lat) * 0.99)] * 1000 if all_lat else 0.0
+    return sum(ops) / elapsed, p50, p99
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seed-docs", type=int, default=20000)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--write-ratio", type=float, default=0.2,
+                    help="fraction of operations that are ingests")
+    ap.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    baseline = _SingleLockBaseline()
+    for _ in range(args.seed_docs):
+        txt = _random_review(rng)
+        baseline.add(txt)
+        add_review_text_for_search(txt)
+
+    print(f"seed_docs={args.seed_docs} write_ratio={args.write_ratio} seconds={args.seconds}")
+    print(f"{'store':<12} {'clients':>7} {'ops/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for clients in args.clients:
+        for name, add, search in (
+            ("single-lock", baseline.add, baseline.search),
+            ("sharded", add_review_text_for_search,
+             lambda q: search_similar(q, k=5, ranking="jaccard")),
+        ):
+            tput, p50, p99 = _run(clients, args.seconds, args.write_ratio, add, search)
+            print(f"{name:<12} {clients:>7} {tput:>10.0f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Sentiment backends side by side: torch fp32 HF pipeline vs the int8 ONNX
+Runtime export (ml/onnx_sentiment.py, SENTIMENT_BACKEND=onnx).
+
+Held-out sample: rows of `--sample` JSONL files (default: the local
+bootstrap slices) after skipping the first `--skip`, `--n` of them.
+Reports:
+  - parity: label agreement, mean / max |P(positive) difference|
+  - accuracy of each backend vs the rating, where the file has one, on the
+    source's own scale (RemoteSource.rating_scale: drugs.com 1-10, Amazon
+    1-5; --rating-scale for other files): rating / scale >= 0.7 positive,
+    <= 0.4 negative, in between skipped (5 stars: 4-5 / 1-2 / 3;
+    10 points: 7-10 / 1-4 / 5-6)
+  - latency: p50 / p99 of single-review calls
+  - throughput: reviews/sec with --batch-size batches
+
+Run from backend/ (the first run exports + quantizes into --cache-dir):
+  PYTHONPATH=. python scripts/bench_sentiment_backends.py --n 1000
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+from ml.onnx_sentiment import load_onnx_pipeline
+from ml.sentiment_model import ONNX_CACHE_DIR, SENTIMENT_MODEL
+
+FALLBACK_SAMPLE = [
+    "The battery life on this phone is embarrassing.",
+    "Screen is gorgeous and the speakers are surprisingly loud.",
+    "Took it for two weeks, the headaches went away completely.",
+    "Constant nausea and dizziness, I had to stop.",
+    "Does what it says, nothing more.",
+    "Returned it after a week, the charger stopped working.",
+]
+
+
+POS_AT = 0.7
+NEG_AT = 0.4
+
+
+def _load_sample(
+    paths: List[str], scales: Dict[str, float], skip: int, n: int
+) -> List[Tuple[str, Optional[float]]]:
+    """(text, rating normalized to 0-1 or None) rows."""
+    rows: List[Tuple[str, Optional[float]]] = []
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        scale = scales[path]
+        with open(path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i < skip:
+                    continue
+                rec = json.loads(line)
+                if rec.get("text"):
+                    rating = rec.get("rating")
+                    rows.append((rec["text"], float(rating) / scale if rating is not None else None))
+                if len(rows) >= n:
+                    return rows
+    return rows or [(t, None) for t in FALLBACK_SAMPLE]
+
+
+def _p_pos(pred: Dict[str, Any]) -> float:
+    score = float(pred["score"])
+    return score if "POS" in pred["label"].upper() else 1.0 - score
+
+
+def _latency(pipe, texts: List[str], **kwargs) -> Tuple[float, float]:
+    lat = []
+    for t in texts:
+        t0 = time.perf_counter()
+        pipe(t, **kwargs)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    lat.sort()
+    return lat[len(lat) // 2], lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+
+
+def _throughput(pipe, texts: List[str], batch_size: int, **kwargs) -> float:
+    t0 = time.perf_counter()
+    pipe(texts, batch_size=batch_size, **kwargs)
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def main():
+    default_samples = [s.url for s in settings.bootstrap_sources if s.fmt == "jsonl"]
+    source_scales = {s.url: s.rating_scale for s in settings.bootstrap_sources}
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sample", nargs="+", default=default_samples)
+    ap.add_argument("--rating-scale", type=float, default=5.0,
+                    help="top of the rating scale for --sample files that aren't bootstrap sources")
+    ap.add_argument("--skip", type=int, default=1000, help="rows per file to skip (not held out)")
+    ap.add_argument("--n", type=int, default=1000)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--latency-n", type=int, default=200)
+    ap.add_argument("--cache-dir", default=ONNX_CACHE_DIR)
+    ap.add_argument("--threads", type=int, default=0, help="ORT intra-op threads (0 = ORT default)")
+    args = ap.parse_args()
+
+    from transformers import pipeline
+    backends = {
+        "torch-fp32": pipeline("sentiment-analysis", model=SENTIMENT_MODEL),
+        "ort-int8": load_onnx_pipeline(SENTIMENT_MODEL, args.cache_dir, intra_op_threads=args.threads),
+    }
+    # the ORT wrapper always truncates to the model max; make torch do the same
+    call_kwargs = {"torch-fp32": {"truncation": True}, "ort-int8": {}}
+
+    scales = {path: source_scales.get(path, args.rating_scale) for path in args.sample}
+    sample = _load_sample(args.sample, scales, args.skip, args.n)
+    texts = [t for t, _ in sample]
+    print(f"model={SENTIMENT_MODEL} sample={len(texts)} batch={args.batch_size}")
+
+    preds = {name: pipe(texts, batch_size=args.batch_size, **call_kwargs[name]) for name, pipe in backends.items()}
+    a, b = preds["torch-fp32"], preds["ort-int8"]
+    agree = sum(x["label"] == y["label"] for x, y in zip(a, b)) / len(texts)
+    diffs = [abs(_p_pos(x) - _p_pos(y)) for x, y in zip(a, b)]
+    print(f"parity: label agreement {agree:.2%}, |dP(pos)| mean {sum(diffs) / len(diffs):.4f} max {max(diffs):.4f}")
+
+    rated = [(i, r) for i, (_, r) in enumerate(sample) if r is not None and (r >= POS_AT or r <= NEG_AT)]
+    if rated:
+        for name, p in preds.items():
+            correct = sum(("POS" in p[i]["label"].upper()) == (r >= POS_AT) for i, r in rated)
+            print(f"accuracy vs rating ({len(rated)} rated): {name} {correct / len(rated):.2%}")
+
+    print(f"{'backend':<12} {'p50 ms':>8} {'p99 ms':>8} {'rev/s':>9}")
+    for name, pipe in backends.items():
+        pipe(texts[:8], **call_kwargs[name])  # warm
+        p50, p99 = _latency(pipe, texts[:args.latency_n], **call_kwargs[name])
+        rate = _throughput(pipe, texts, args.batch_size, **call_kwargs[name])
+        print(f"{name:<12} {p50:>8.2f} {p99:>8.2f} {rate:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+spaCy throughput for bulk aspect extraction (ml/spacy_service.py).
+
+Parses `--docs` synthetic reviews four ways and reports docs/sec and the
+speedup over the old per-document call:
+  - per-doc full   : full en_core_web_sm, nlp(text) per review (before)
+  - pipe full      : full pipeline, nlp.pipe batches
+  - pipe profile   : noun_chunks / ner profile (unused components excluded),
+                     nlp.pipe batches, for each --batch-size
+  - pipe profile mp: same with --n-process workers (if > 1)
+and checks the profile yields the same noun chunks / entities as the full
+pipeline on the first 200 reviews.
+
+Run from backend/:
+  PYTHONPATH=. python scripts/bench_spacy_pipe.py --docs 10000 --batch-size 32 128 --n-process 4
+"""
+import argparse
+import random
+import time
+from typing import Callable, List
+
+import spacy
+
+from ml.spacy_service import NER, NOUN_CHUNKS, SPACY_MODEL, SpacyService
+
+SENTENCES = [
+    "The battery life on this phone is embarrassing.",
+    "I took Lisinopril for two weeks and the dizziness was awful.",
+    "Customer service at Best Buy replaced the charger quickly.",
+    "The screen is gorgeous but the speaker distorts at high volume.",
+    "My doctor switched me to a lower dose after the headaches started.",
+    "Shipping from Amazon took nine days and the box was crushed.",
+    "Sound quality is great for the price.",
+    "It overheats when I play games for more than an hour.",
+]
+
+
+def _reviews(n: int) -> List[str]:
+    rng = random.Random(0)
+    return [" ".join(rng.choices(SENTENCES, k=rng.randint(1, 6))) for _ in range(n)]
+
+
+def _rate(fn: Callable[[], int]) -> float:
+    t0 = time.perf_counter()
+    n = fn()
+    return n / (time.perf_counter() - t0)
+
+
+def _signature(doc, profile: str):
+    if profile == NER:
+        return [(e.text, e.label_) for e in doc.ents]
+    return [c.text for c in doc.noun_chunks]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=10000)
+    ap.add_argument("--profile", choices=[NOUN_CHUNKS, NER], default=NOUN_CHUNKS)
+    ap.add_argument("--batch-size", type=int, nargs="+", default=[32, 128])
+    ap.add_argument("--n-process", type=int, default=1)
+    args = ap.parse_args()
+
+    texts = _reviews(args.docs)
+    full = spacy.load(SPACY_MODEL)
+    service = SpacyService(SPACY_MODEL)
+    nlp = service.nlp(args.profile)
+    print(f"model={SPACY_MODEL} docs={args.docs} profile={args.profile}")
+    print(f"  full components:    {full.pipe_names}")
+    print(f"  profile components: {nlp.pipe_names}")
+
+    same = all(
+        _signature(a, args.profile) == _signature(b, args.profile)
+        for a, b in zip(full.pipe(texts[:200]), nlp.pipe(texts[:200]))
+    )
+    print(f"  profile output matches full pipeline on 200 docs: {same}")
+
+    print(f"{'run':<22} {'batch':>6} {'procs':>6} {'docs/s':>9} {'speedup':>8}")
+    base = _rate(lambda: sum(1 for t in texts if full(t) is not None))
+    print(f"{'per-doc full':<22} {'1':>6} {'1':>6} {base:>9.1f} {1.0:>8.2f}")
+
+    rate = _rate(lambda: sum(1 for _ in full.pipe(texts, batch_size=args.batch_size[0])))
+    print(f"{'pipe full':<22} {args.batch_size[0]:>6} {'1':>6} {rate:>9.1f} {rate / base:>8.2f}")
+
+    for bs in args.batch_size:
+        rate = _rate(lambda: sum(1 for _ in service.pipe(texts, args.profile, batch_size=bs, n_process=1)))
+        print(f"{'pipe profile':<22} {bs:>6} {'1':>6} {rate:>9.1f} {rate / base:>8.2f}")
+
+    if args.n_process > 1:
+        bs = args.batch_size[-1]
+        rate = _rate(lambda: sum(1 for _ in service.pipe(texts, args.profile, batch_size=bs, n_process=args.n_process)))
+        print(f"{'pipe profile mp':<22} {bs:>6} {args.n_process:>6} {rate:>9.1f} {rate / base:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 # services/explain_model.py
 
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from ml.sentiment_model import predict_sentiment, aspect_breakdown
+from services.token_attribution import attribute_tokens
 
 # rolling aspect stats for EDA
 # _eda_tracker = {
@@ -176,32 +177,18 @@ def analyze_aspects(text: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     return aspects_list, debug_info
 
 
-def token_attributions(text: str) -> List[Dict[str, Any]]:
+def token_attributions(
+    text: str,
+    mode: str = "token",
+    cost: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
     """
     Per-token sentiment explanation.
     BEFORE: we snapped each token into {-0.4, 0.05, 0.4}
-    NOW:    we return continuous sentiment per token ([-1..1]) based on
-            predict_sentiment(token). This gives Scatter-ish distribution
-            instead of flat 0.4 / -0.4 everywhere.
+    NOW:    we return continuous sentiment per token ([-1..1]).
+            mode="token" is predict_sentiment(token) per token (scored in
+            batches), "occlusion" the sentiment change when the token is
+            dropped, "lexicon" the word-list scores; see
+            services/token_attribution.py. `cost` gets passes / ms.
     """
-    toks = text.split()
-    out: List[Dict[str, Any]] = []
-
-    for tok in toks:
-        sent = predict_sentiment(tok)
-        lbl = sent.get("label", "NEUTRAL")
-        conf = _validate_confidence(float(sent.get("score", 0.5)))
-
-        cont = _continuous_sentiment(lbl, conf)
-        # clamp just in case
-        if cont < -1.0:
-            cont = -1.0
-        if cont > 1.0:
-            cont = 1.0
-
-        out.append({
-            "token": tok,
-            "score": cont  # continuous now, e.g. -0.78, 0.12, etc.
-        })
-
-    return out
+    return attribute_tokens(text.split(), mode=mode, cost=cost)
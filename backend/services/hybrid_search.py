@@ -0,0 +1,242 @@
+# backend/services/hybrid_search.py
+import time
+from typing import Iterator, List, Dict, Any, Optional
+
+from core.logging import get_logger
+from services.lightweight_search import RANKINGS, search_similar
+
+log = get_logger("hybrid_search")
+
+SEARCH_MODES = ("lexical", "semantic", "hybrid")
+MAX_K = 100
+
+# reciprocal rank fusion: score(doc) = sum over lists of 1 / (RRF_K + rank)
+RRF_K = 60
+# how many candidates each retriever contributes to the fusion, per requested hit
+CANDIDATES_PER_HIT = 4
+
+
+def _default_mode(filters: Dict[str, Any]) -> str:
+    # no mode given: the original lexical /search (score = BM25 / overlap),
+    # or semantic when filters need the FAISS attributes; hybrid is opt-in
+    # since its score is an RRF value, not a similarity
+    return "semantic" if filters else "lexical"
+
+
+class SemanticUnavailable(RuntimeError):
+    """FAISS index / embedding model can't be loaded in this process."""
+
+
+def _get_semantic():
+    try:
+        # imported lazily: faiss / sentence-transformers aren't in requirements-lite
+        from services.semantic_index import get_semantic_index
+        return get_semantic_index()
+    except Exception as e:
+        raise SemanticUnavailable(str(e)) from e
+
+
+def _semantic_search(
+    query: str,
+    k: int,
+    timings: Dict[str, float],
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    t0 = time.perf_counter()
+    sem = _get_semantic()
+    # only non-trivial on the first request, when the model + index load
+    timings["semantic_load_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    stage: Dict[str, float] = {}
+    hits = sem.search(query, top_k=k, timings=stage, filters=filters)
+    timings["semantic_embed_ms"] = stage.get("embed_ms", 0.0)
+    timings["semantic_faiss_ms"] = stage.get("faiss_ms", 0.0)
+    timings["semantic_meta_ms"] = stage.get("meta_ms", 0.0)
+    if "batch_wait_ms" in stage:
+        # embed/faiss above are for the whole micro-batch this query rode in
+        timings["semantic_batch_wait_ms"] = stage["batch_wait_ms"]
+    return hits
+
+
+def _rrf_fuse(ranked_lists: Dict[str, List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+    """
+    Fuse several ranked hit lists by reciprocal rank. Hits are matched on
+    their review text, since lexical and semantic ids aren't shared.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for source, hits in ranked_lists.items():
+        for rank, hit in enumerate(hits, start=1):
+            row = fused.get(hit["text"])
+            if row is None:
+                row = {"text": hit["text"], "score": 0.0}
+                fused[hit["text"]] = row
+            row["score"] += 1.0 / (RRF_K + rank)
+            row[f"{source}_rank"] = rank
+            row[f"{source}_score"] = hit["score"]
+
+    out = sorted(fused.values(), key=lambda r: r["score"], reverse=True)[:k]
+    for row in out:
+        row["score"] = round(row["score"], 5)
+    return out
+
+
+def hybrid_search(
+    query: str,
+    k: int = 5,
+    mode: Optional[str] = None,
+    ranking: str = "bm25",
+    filters: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    /search backend.
+    mode:
+      - "lexical"  : in-memory inverted index (services.lightweight_search)
+      - "semantic" : on-disk FAISS index (services.semantic_index)
+      - "hybrid"   : both, fused with reciprocal rank fusion; hit "score" is
+                     the RRF value (per-retriever scores are in
+                     lexical_score / semantic_score). If the FAISS index
+                     isn't available we degrade to lexical and say so.
+      - None       : "lexical", or "semantic" when filters are given
+    filters (domain / source / product / min_rating / max_rating) only exist
+    on the FAISS side: lexical rejects them, hybrid serves semantic-only.
+    Returns {"hits": [...], "mode": <mode actually served>, "timings_ms": {...}}.
+    Raises ValueError on bad arguments, SemanticUnavailable for mode="semantic"
+    (or any filtered search) without an index.
+    """
+    if mode is not None and mode not in SEARCH_MODES:
+        raise ValueError(f"Unsupported mode: {mode}")
+    if ranking not in RANKINGS:
+        raise ValueError(f"Unsupported ranking: {ranking}")
+    if k < 1 or k > MAX_K:
+        raise ValueError(f"k must be between 1 and {MAX_K}")
+
+    filters = {name: v for name, v in (filters or {}).items() if v not in (None, "", [])}
+    if mode is None:
+        mode = _default_mode(filters)
+    if filters:
+        if mode == "lexical":
+            raise ValueError("filters need mode=semantic or hybrid (the lexical index has no attributes)")
+        # in-memory reviews carry no domain/source/rating, so fusing them in
+        # would leak unfiltered hits
+        mode = "semantic"
+
+    timings: Dict[str, float] = {}
+    t_start = time.perf_counter()
+    fetch_k = k if mode != "hybrid" else k * CANDIDATES_PER_HIT
+
+    lexical: Optional[List[Dict[str, Any]]] = None
+    if mode in ("lexical", "hybrid"):
+        t0 = time.perf_counter()
+        lexical = search_similar(query, k=fetch_k, ranking=ranking)
+        timings["lexical_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    semantic: Optional[List[Dict[str, Any]]] = None
+    served = mode
+    semantic_error = None
+    if mode in ("semantic", "hybrid"):
+        try:
+            semantic = _semantic_search(query, fetch_k, timings, filters=filters)
+        except SemanticUnavailable as e:
+            if mode == "semantic":
+                raise
+            log.warning("semantic search unavailable, serving lexical only: {}", e)
+            served = "lexical"
+            semantic_error = str(e)
+
+    if lexical is not None and semantic is not None:
+        t0 = time.perf_counter()
+        hits = _rrf_fuse({"lexical": lexical, "semantic": semantic}, k)
+        timings["fusion_ms"] = (time.perf_counter() - t0) * 1000.0
+    elif semantic is not None:
+        hits = semantic[:k]
+    else:
+        hits = (lexical or [])[:k]
+
+    timings["total_ms"] = (time.perf_counter() - t_start) * 1000.0
+    out: Dict[str, Any] = {
+        "hits": hits,
+        "mode": served,
+        "timings_ms": {name: round(ms, 3) for name, ms in timings.items()},
+    }
+    if semantic_error is not None:
+        out["semantic_error"] = semantic_error
+    return out
+
+
+def hybrid_search_batch(
+    items: List[Dict[str, Any]],
+    mode: Optional[str] = None,
+    ranking: str = "bm25",
+    chunk_size: int = 256,
+) -> Iterator[Dict[str, Any]]:
+    """
+    /search/batch backend. items are {"query", "k", "filters"}; yields one
+    {"hits", "mode"} per item, in request order, same semantics per item as
+    hybrid_search(). Everything is validated before the first result, so a
+    bad item raises ValueError (and a missing index for semantic / filtered
+    items raises SemanticUnavailable) up front, not half-way through a stream.
+
+    Semantic retrieval runs per chunk of `chunk_size` items: one encode and
+    one index.search per distinct filter in the chunk
+    (SemanticIndex.search_many), which bounds memory for huge batches.
+    """
+    if mode is not None and mode not in SEARCH_MODES:
+        raise ValueError(f"Unsupported mode: {mode}")
+    if ranking not in RANKINGS:
+        raise ValueError(f"Unsupported ranking: {ranking}")
+    plans = []
+    for i, item in enumerate(items):
+        k = item.get("k", 5)
+        if k < 1 or k > MAX_K:
+            raise ValueError(f"item {i}: k must be between 1 and {MAX_K}")
+        filters = {n: v for n, v in (item.get("filters") or {}).items() if v not in (None, "", [])}
+        item_mode = mode or _default_mode(filters)
+        if filters:
+            if mode == "lexical":
+                raise ValueError(f"item {i}: filters need mode=semantic or hybrid")
+            item_mode = "semantic"
+        plans.append((item.get("query") or "", k, filters, item_mode))
+
+    sem = None
+    semantic_error = None
+    if any(p[3] != "lexical" for p in plans):
+        try:
+            sem = _get_semantic()
+        except SemanticUnavailable as e:
+            if any(p[3] == "semantic" for p in plans):
+                raise
+            log.warning("semantic search unavailable, serving batch lexical only: {}", e)
+            semantic_error = str(e)
+
+    for start in range(0, len(plans), chunk_size):
+        chunk = plans[start:start + chunk_size]
+
+        semantic: List[Optional[List[Dict[str, Any]]]] = [None] * len(chunk)
+        if sem is not None:
+            want = [j for j, p in enumerate(chunk) if p[3] != "lexical"]
+            found = sem.search_many([
+                (chunk[j][0], chunk[j][1] * (CANDIDATES_PER_HIT if chunk[j][3] == "hybrid" else 1), chunk[j][2])
+                for j in want
+            ])
+            for j, hits in zip(want, found):
+                semantic[j] = hits
+
+        for j, (query, k, _, item_mode) in enumerate(chunk):
+            served = item_mode
+            lexical = None
+            if item_mode in ("lexical", "hybrid"):
+                fetch_k = k if item_mode == "lexical" else k * CANDIDATES_PER_HIT
+                lexical = search_similar(query, k=fetch_k, ranking=ranking)
+
+            if lexical is not None and semantic[j] is not None:
+                hits = _rrf_fuse({"lexical": lexical, "semantic": semantic[j]}, k)
+            elif semantic[j] is not None:
+                hits = semantic[j][:k]
+            else:
+                hits = (lexical or [])[:k]
+                served = "lexical"
+
+            out: Dict[str, Any] = {"hits": hits, "mode": served}
+            if semantic_error is not None and item_mode == "hybrid":
+                out["semantic_error"] = semantic_error
+            yield out
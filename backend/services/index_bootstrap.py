@@ -1,13 +1,21 @@
 # backend/services/index_bootstrap.py
+import queue
+import shutil
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
-import json
+from typing import List, Dict, Any, Callable, Tuple
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 
 from core.config import settings
 from core.logging import get_logger
+from ml.ann_index import add_vectors, build_trained, id_mapped, make_index, train_sample_size
+from ml.embed_cache import EmbeddingCache
+from ml.index_versions import gc_versions, new_version_dir, publish, write_build_state
+from ml.meta_store import MetaStoreWriter
+from ml.parallel_embed import ShardedEncoder
 from services.public_data import PublicDataLoader
 
 log = get_logger("index_bootstrap")
@@ -27,86 +35,328 @@ def _canonical_text(row: Dict[str, Any]) -> str:
     dom     = row.get("domain", "?")
     return f"[{src} {dom}] {product} {cond} :: {txt}"
 
-def build_index(max_items_per_source: int = 1000, batch_size: int = 256) -> Tuple[int, int]:
+# end-of-stream marker passed down the build pipeline
+_DONE = object()
+
+
+class _StageStats:
+    """rows handled + seconds spent working (not blocked on a queue) by one stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, rows: int, busy_s: float):
+        with self._lock:
+            self.rows += rows
+            self.busy_s += busy_s
+
+    def summary(self) -> str:
+        rate = self.rows / self.busy_s if self.busy_s > 0 else 0.0
+        return f"{self.name}: rows={self.rows} busy={self.busy_s:.1f}s rows/s={rate:.0f}"
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    # blocking put that gives up once the pipeline is being torn down
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _stage_thread(name: str, fn: Callable[[], None], out_q: queue.Queue, stop: threading.Event) -> threading.Thread:
+    """
+    Run one pipeline stage. Whatever happens, the next stage gets _DONE;
+    an exception is kept on thread.error for build_index to re-raise.
+    """
+    def run():
+        try:
+            fn()
+        except Exception as e:
+            log.error("build_index stage {} failed: {}", name, e)
+            t.error = e
+        finally:
+            _put(out_q, _DONE, stop)
+
+    t = threading.Thread(target=run, name=name, daemon=True)
+    t.error = None
+    t.start()
+    return t
+
+
+def build_index(
+    max_items_per_source: int = 1000,
+    batch_size: int = 256,
+    index_type: str | None = None,
+    nlist: int | None = None,
+    hnsw_m: int | None = None,
+    pq_m: int | None = None,
+    pq_nbits: int | None = None,
+    use_cache: bool | None = None,
+    sort_window: int = 8,
+    progress_every_s: float = 10.0,
+    workers: int | None = None,
+    threads_per_worker: int | None = None,
+) -> Tuple[int, int]:
     """
     Cold-start / demo index builder.
 
     Streams public data (not from Postgres), embeds with SentenceTransformer,
-    normalizes, and writes:
-      - settings.faiss_index_path  (index.faiss)
-      - settings.faiss_meta_path   (meta.json lines)
+    normalizes, and writes a new version directory under settings.index_dir
+    (ml/index_versions.py) with:
+      - index.faiss
+      - meta.jsonl + meta.idx store (ml/meta_store.py)
+    Only a complete build is published (atomic `current` symlink switch);
+    the version it replaces is garbage-collected after
+    settings.index_gc_grace_s, and a SemanticIndex loaded in this process is
+    switched over right away (others pick it up on their next reload check).
+    index_type is "flat" | "ivf" | "hnsw" or a compressed "fp16" | "sq8" |
+    "ivfpq" (see ml/ann_index.py), defaulting to settings.index_type.
+    Types that need training (IVF centroids, SQ8 ranges, PQ codebooks) are
+    trained on the first vectors, which are held back until training is done.
+    Embeddings go through the on-disk cache (ml/embed_cache.py) unless
+    use_cache=False / settings.embed_cache_enabled is off, so a rebuild only
+    runs the model on rows whose canonical text changed.
+
+    Reading, embedding and FAISS/metadata writes run as a pipeline (reader
+    thread -> embed thread -> caller) over bounded queues. The embed stage
+    takes sort_window * batch_size rows at a time and encodes them in
+    length-sorted batches of batch_size. Per-stage rows/sec is logged every
+    progress_every_s and at the end; the slowest stage is the bottleneck.
+    With workers > 1 (default settings.index_build_workers) the embed stage
+    hands each chunk to that many model processes, one shard each
+    (ml/parallel_embed.py), and the writer merges them back in order.
     Returns (total_seen, kept_indexed).
     """
     _ensure_dirs()
 
+    index_type = (index_type or settings.index_type).lower()
+    nlist = nlist or settings.index_nlist
+    hnsw_m = hnsw_m or settings.index_hnsw_m
+    pq_m = pq_m or settings.index_pq_m
+    pq_nbits = pq_nbits or settings.index_pq_nbits
+
     loader = PublicDataLoader(max_items=max_items_per_source)
     model = SentenceTransformer(settings.emb_model)
     dim = model.get_sentence_embedding_dimension()
+    if use_cache is None:
+        use_cache = settings.embed_cache_enabled
+    cache = EmbeddingCache(settings.embed_cache_dir / "public", settings.emb_model, dim) if use_cache else None
+    workers = workers or settings.index_build_workers
+    sharded = ShardedEncoder(
+        settings.emb_model,
+        workers,
+        threads_per_worker=threads_per_worker or settings.index_build_threads_per_worker or None,
+        batch_size=batch_size,
+    ) if workers > 1 else None
 
-    # cosine sim via inner product on L2-normalized vectors
-    index = faiss.IndexFlatIP(dim)
-
-    total = 0
-    kept = 0
-    buf_vecs: List[np.ndarray] = []
-    buf_meta: List[Dict[str, Any]] = []
-
-    meta_tmp_path = settings.faiss_meta_path
-    # overwrite old meta
-    if meta_tmp_path.exists():
-        meta_tmp_path.unlink()
-
-    def flush():
-        nonlocal buf_vecs, buf_meta, index
-        if not buf_vecs:
-            return
-        mat = np.vstack(buf_vecs).astype("float32")
-        faiss.normalize_L2(mat)
-        index.add(mat)
-        with open(meta_tmp_path, "a", encoding="utf-8") as f:
-            for m in buf_meta:
-                f.write(json.dumps(m, ensure_ascii=False) + "\n")
-        buf_vecs.clear()
-        buf_meta.clear()
-
-    for row in loader.stream_all():
-        total += 1
-        text = _canonical_text(row).strip()
-        if not text:
-            continue
-
-        vec = model.encode(
-            text,
+    def encode(texts: List[str]) -> np.ndarray:
+        return model.encode(
+            texts,
+            batch_size=len(texts),
             convert_to_numpy=True,
             normalize_embeddings=False,
         )
 
-        buf_vecs.append(vec)
-        buf_meta.append({
-            "id": row.get("id"),
-            "product": row.get("product"),
-            "domain": row.get("domain"),
-            "source": row.get("source"),
-            "text": row.get("text"),
-            "rating": row.get("rating"),
-            "date": row.get("date"),
-        })
-        kept += 1
+    # cosine sim via inner product on L2-normalized vectors, ID-mapped so the
+    # ingest embedder can keep appending with ids = metadata record ids.
+    # Index types that need training are created once enough vectors arrived.
+    train_n = train_sample_size(index_type, nlist)
+    index = None if train_n else id_mapped(
+        make_index(dim, index_type, nlist=nlist, hnsw_m=hnsw_m, pq_m=pq_m, pq_nbits=pq_nbits)
+    )
+    pending: List[np.ndarray] = []
+    pending_rows = 0
+
+    # everything goes to an unpublished version dir; readers keep serving
+    # the current one until publish(). record i <-> FAISS id i
+    version_dir = new_version_dir(settings.index_dir)
+    meta_writer = MetaStoreWriter(version_dir / "meta.jsonl", mode="w")
+
+    def train_and_add_pending():
+        nonlocal index, pending_rows
+        sample = np.vstack(pending)
+        index = id_mapped(
+            build_trained(sample, index_type, nlist=nlist, hnsw_m=hnsw_m, pq_m=pq_m, pq_nbits=pq_nbits)
+        )
+        add_vectors(index, sample, index.ntotal)
+        pending.clear()
+        pending_rows = 0
+
+    # three stages, bounded queues in between (so a slow stage applies
+    # backpressure instead of buffering the corpus):
+    #   reader thread : stream rows, build canonical text + metadata record
+    #   embed thread  : length-sorted true batches through the cache / model
+    #   this thread   : FAISS add (+ training) and metadata append
+    stop = threading.Event()
+    rows_q: "queue.Queue[Any]" = queue.Queue(maxsize=batch_size * sort_window * 2)
+    vecs_q: "queue.Queue[Any]" = queue.Queue(maxsize=4)
+    read_stats = _StageStats("read")
+    embed_stats = _StageStats("embed")
+    write_stats = _StageStats("write")
+    seen = {"total": 0}
+
+    def reader():
+        t0 = time.perf_counter()
+        for row in loader.stream_all():
+            seen["total"] += 1
+            text = _canonical_text(row).strip()
+            if not text:
+                continue
+            item = (text, {
+                "id": row.get("id"),
+                "product": row.get("product"),
+                "domain": row.get("domain"),
+                "source": row.get("source"),
+                "text": row.get("text"),
+                "rating": row.get("rating"),
+                "date": row.get("date"),
+            })
+            read_stats.add(1, time.perf_counter() - t0)
+            if not _put(rows_q, item, stop):
+                return
+            t0 = time.perf_counter()
+
+    def embedder():
+        # enough rows per chunk that every worker gets a full batch
+        chunk_size = batch_size * (max(sort_window, workers) if sharded is not None else sort_window)
+        done = False
+        while not done:
+            chunk = []
+            while len(chunk) < chunk_size:
+                item = _get(rows_q, stop)
+                if item is _DONE:
+                    done = True
+                    break
+                chunk.append(item)
+            if not chunk:
+                break
 
-        if len(buf_vecs) >= batch_size:
-            flush()
+            t0 = time.perf_counter()
+            texts = [t for t, _ in chunk]
+            if sharded is not None:
+                # workers shard the chunk and length-sort their own shard
+                mat = cache.encode(texts, sharded) if cache is not None else sharded(texts)
+                mat = np.ascontiguousarray(mat, dtype="float32")
+            else:
+                # sort by length so each forward pass pads to similar lengths,
+                # then put the vectors back in stream order
+                order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+                mat = np.empty((len(texts), dim), dtype="float32")
+                for b in range(0, len(order), batch_size):
+                    ids = order[b:b + batch_size]
+                    batch = [texts[i] for i in ids]
+                    mat[ids] = cache.encode(batch, encode) if cache is not None else encode(batch)
+            faiss.normalize_L2(mat)
+            embed_stats.add(len(chunk), time.perf_counter() - t0)
+            if not _put(vecs_q, (mat, [m for _, m in chunk]), stop):
+                return
 
-    flush()
+    threads = [
+        _stage_thread("index-read", reader, rows_q, stop),
+        _stage_thread("index-embed", embedder, vecs_q, stop),
+    ]
+
+    kept = 0
+    last_log = time.perf_counter()
+    try:
+        while True:
+            item = _get(vecs_q, stop)
+            if item is _DONE:
+                break
+            mat, metas = item
+            t0 = time.perf_counter()
+            if index is None:
+                # still collecting the training sample; meta order is unaffected
+                pending.append(mat)
+                pending_rows += len(mat)
+                if pending_rows >= train_n:
+                    train_and_add_pending()
+            else:
+                add_vectors(index, mat, index.ntotal)
+            meta_writer.extend(metas)
+            kept += len(metas)
+            write_stats.add(len(metas), time.perf_counter() - t0)
 
-    # write FAISS index file
-    faiss.write_index(index, str(settings.faiss_index_path))
+            if time.perf_counter() - last_log >= progress_every_s:
+                last_log = time.perf_counter()
+                log.info(
+                    "build_index progress: {} | queues rows={} vecs={}",
+                    " ".join(st.summary() for st in (read_stats, embed_stats, write_stats)),
+                    rows_q.qsize(),
+                    vecs_q.qsize(),
+                )
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        meta_writer.close()
+        if sharded is not None:
+            sharded.close()
+
+    for t in threads:
+        if t.error is not None:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise t.error
+    total = seen["total"]
+    # the stage with the lowest busy rows/s is the bottleneck
+    for st in (read_stats, embed_stats, write_stats):
+        log.info("build_index stage {}", st.summary())
+
+    if cache is not None:
+        # entries no row asked for this time are stale (changed/removed text)
+        dropped = cache.compact()
+        log.info("Embedding cache {}: {} (compacted away {})", cache.cache_dir, cache.stats(), dropped)
+        cache.close()
+    if index is None:
+        if pending:
+            # corpus smaller than the training sample: train on all of it
+            train_and_add_pending()
+        else:
+            index = id_mapped(make_index(dim, "flat"))
+
+    # write FAISS index file, then switch readers over to the new version
+    faiss.write_index(index, str(version_dir / "index.faiss"))
+    # ids >= rows are later ingest appends, carried over to the next version
+    write_build_state(version_dir, {"rows": int(index.ntotal)})
+    previous = publish(settings.index_dir, version_dir)
+    removed = gc_versions(settings.index_dir, settings.index_gc_grace_s, keep=settings.index_keep_versions)
 
     log.info(
-        "Bootstrap index built total_seen={} kept={} index_path={} meta_path={}",
+        "Bootstrap index built type={} workers={} total_seen={} kept={} version={} (was {}, gc'd {}) index_path={} meta_path={}",
+        index_type,
+        workers,
         total,
         kept,
-        settings.faiss_index_path,
-        settings.faiss_meta_path,
+        version_dir.name,
+        previous,
+        removed,
+        version_dir / "index.faiss",
+        version_dir / "meta.jsonl",
     )
 
+    # imported here: semantic_index pulls in the model stack at import time
+    from services.semantic_index import reload_if_loaded
+    try:
+        reload_if_loaded()
+    except Exception as e:
+        log.error("Published {} but the loaded semantic index did not switch: {}", version_dir.name, e)
+
     return total, kept
@@ -2,6 +2,8 @@
 import re
 from typing import List, Dict, Any
 from .state_store import GLOBAL_ASPECT_COUNTS, ASPECT_LOCK
+from .token_attribution import attribute_tokens
+from core.config import settings
 from core.db import db_upsert_aspect, db_insert_review
 
 POS_WORDS = {
@@ -97,19 +99,23 @@ def _detect_aspects(text: str) -> List[Dict[str, Any]]:
 
     return out
 
-def _token_attributions(text: str) -> List[Dict[str, Any]]:
-    toks = _tokenize(text)
-    pills = []
-    for t in toks:
-        lw = t.lower().strip(".,!?")
-        if lw in POS_WORDS:
-            score = 0.4
-        elif lw in NEG_WORDS:
-            score = -0.4
-        else:
-            score = 0.05
-        pills.append({"token": t, "score": float(score)})
-    return pills
+def lexicon_score(token: str) -> float:
+    lw = token.lower().strip(".,!?")
+    if lw in POS_WORDS:
+        return 0.4
+    if lw in NEG_WORDS:
+        return -0.4
+    return 0.05
+
+def _token_attributions(text: str, cost: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # "lexicon" unless settings.explain_attribution_mode asks for a model mode
+    return attribute_tokens(
+        _tokenize(text),
+        mode=settings.explain_attribution_mode,
+        batch_size=settings.explain_attribution_batch_size,
+        max_passes=settings.explain_attribution_max_passes,
+        cost=cost,
+    )
 
 def _update_memory_aspect_agg(aspects: List[Dict[str, Any]]):
     with ASPECT_LOCK:
@@ -137,7 +143,8 @@ def update_everything_with_text(review_text: str) -> Dict[str, Any]:
     - push stats + raw review to Neon if available
     """
     aspects = _detect_aspects(review_text)
-    tokens = _token_attributions(review_text)
+    attribution_cost: Dict[str, Any] = {}
+    tokens = _token_attributions(review_text, attribution_cost)
 
     # persist raw text if DB available
     db_insert_review(review_text)
@@ -148,4 +155,5 @@ def update_everything_with_text(review_text: str) -> Dict[str, Any]:
     return {
         "aspects": aspects,
         "tokens": tokens,
+        "attribution_cost": attribution_cost,
     }
@@ -1,37 +1,200 @@
 # backend/services/lightweight_search.py
-from typing import List, Dict, Any
-from .state_store import GLOBAL_REVIEWS, REVIEWS_LOCK
+import heapq
+import math
+import sys
+from array import array
+from collections import Counter
+from itertools import chain
+from typing import List, Dict, Any, Tuple
+from .state_store import GLOBAL_REVIEWS, RWLock
+
+# BM25 knobs (standard Okapi defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# rough fixed cost of a new term: dict slot + tuple + two empty arrays
+_TERM_OVERHEAD = 250
+
+class InvertedIndex:
+    """
+    In-memory inverted index over one shard of GLOBAL_REVIEWS, maintained on
+    ingest and guarded by its own readers-writer lock.
+
+    - postings:   term -> (array of doc_ids, array of term counts), parallel,
+                  in ingest order
+    - doc_len / doc_distinct: tokens / distinct terms per doc, in arrays
+                  indexed by doc_id // n_shards (the shard's local slot)
+    - total_len:  corpus statistic for BM25, kept up to date here so queries
+                  never recompute it. Document frequency of a term is just
+                  the length of its postings.
+
+    Postings hold term counts directly (a few bytes per term per doc)
+    instead of a Counter per document, which cost more than the review
+    text. nbytes is the approximate resident size, reported with the review
+    store (ShardedReviewStore.add_index_bytes).
+
+    A query only walks the postings of its own terms, so cost scales with
+    how common the query terms are, not with the size of the corpus.
+    """
+
+    def __init__(self, n_shards: int = 1):
+        self.n_shards = n_shards
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_len = array("I")
+        self.doc_distinct = array("I")
+        self.n_docs = 0
+        self.total_len = 0
+        self.nbytes = 0
+        self.lock = RWLock()
+
+    def add(self, doc_id: int, tokens: List[str]) -> int:
+        """Index one doc; returns the approximate bytes this added."""
+        counts = Counter(tokens)
+        slot = doc_id // self.n_shards
+        grow = slot + 1 - len(self.doc_len)
+        if grow > 0:
+            # concurrent ingest can hand out doc ids slightly out of order
+            self.doc_len.extend([0] * grow)
+            self.doc_distinct.extend([0] * grow)
+        self.doc_len[slot] = len(tokens)
+        self.doc_distinct[slot] = len(counts)
+        self.n_docs += 1
+        self.total_len += len(tokens)
+
+        added = 8 * max(grow, 0)
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("I"), array("H"))
+                added += _TERM_OVERHEAD + sys.getsizeof(term)
+            posting[0].append(doc_id)
+            posting[1].append(min(tf, 0xFFFF))
+            added += 6
+        self.nbytes += added
+        return added
+
+    def df(self, term: str) -> int:
+        posting = self.postings.get(term)
+        return len(posting[0]) if posting is not None else 0
+
+    def distinct_terms(self, doc_id: int) -> int:
+        return self.doc_distinct[doc_id // self.n_shards]
+
+    def overlap(self, query_terms: set) -> Dict[int, int]:
+        """
+        doc_id -> number of distinct query terms the doc contains
+        (only docs sharing at least one term show up).
+        """
+        hits: Dict[int, int] = {}
+        for term in query_terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            for doc_id in posting[0]:
+                hits[doc_id] = hits.get(doc_id, 0) + 1
+        return hits
+
+    def bm25(self, idf: Dict[str, float], avgdl: float) -> Dict[int, float]:
+        """
+        doc_id -> BM25 score, accumulated term by term over the postings.
+        idf / avgdl are corpus-wide (all shards), computed by the caller.
+        """
+        scores: Dict[int, float] = {}
+        for term, term_idf in idf.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            for doc_id, tf in zip(*posting):
+                dl = self.doc_len[doc_id // self.n_shards]
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * dl / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + term_idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return scores
+
+# one index per review-store shard, so ingest into one shard never blocks
+# searches over the others
+SHARD_INDEXES = [InvertedIndex(GLOBAL_REVIEWS.n_shards) for _ in range(GLOBAL_REVIEWS.n_shards)]
 
 def add_review_text_for_search(text: str):
-    with REVIEWS_LOCK:
-        GLOBAL_REVIEWS.append({"text": text})
+    tokens = _tokenize_simple(text)
+    doc_id = GLOBAL_REVIEWS.append({"text": text})
+    idx = SHARD_INDEXES[GLOBAL_REVIEWS.shard_of(doc_id)]
+    with idx.lock.write():
+        added = idx.add(doc_id, tokens)
+    GLOBAL_REVIEWS.add_index_bytes(added)
 
 def _tokenize_simple(s: str) -> List[str]:
     return [t.lower().strip(".,!?") for t in s.split() if t.strip()]
 
-def _score(query_tokens: List[str], doc_tokens: List[str]) -> float:
-    # simple Jaccard-ish overlap
-    if not doc_tokens:
-        return 0.0
-    q = set(query_tokens)
-    d = set(doc_tokens)
-    if not q or not d:
-        return 0.0
-    inter = len(q & d)
-    union = len(q | d)
-    if union == 0:
+def _score(inter: int, q_size: int, d_size: int) -> float:
+    # simple Jaccard-ish overlap: |q & d| / |q | d| from cached set sizes
+    union = q_size + d_size - inter
+    if union <= 0:
         return 0.0
     return inter / union
 
-def search_similar(query: str, k: int = 5) -> List[Dict[str, Any]]:
-    q_tokens = _tokenize_simple(query)
-    scored = []
-    with REVIEWS_LOCK:
-        for row in GLOBAL_REVIEWS:
-            doc_text = row["text"]
-            doc_tokens = _tokenize_simple(doc_text)
-            s = _score(q_tokens, doc_tokens)
-            if s > 0.0:
-                scored.append({"text": doc_text, "score": round(s, 3)})
-    scored.sort(key=lambda r: r["score"], reverse=True)
-    return scored[:k]
+def _corpus_idf(q_terms: set) -> Tuple[Dict[str, float], float]:
+    """
+    Corpus-wide BM25 idf per query term + average doc length, summed over
+    shards. Lucene-style idf, always >= 0 so very common terms can't go negative.
+    """
+    n = 0
+    total_len = 0
+    df = dict.fromkeys(q_terms, 0)
+    for idx in SHARD_INDEXES:
+        with idx.lock.read():
+            n += idx.n_docs
+            total_len += idx.total_len
+            for term in q_terms:
+                df[term] += idx.df(term)
+    idf = {
+        term: math.log(1.0 + (n - d + 0.5) / (d + 0.5))
+        for term, d in df.items()
+        if d > 0
+    }
+    avgdl = (total_len / n) if n else 1.0
+    return idf, avgdl or 1.0
+
+RANKINGS = ("bm25", "jaccard")
+
+def search_similar(query: str, k: int = 5, ranking: str = "bm25") -> List[Dict[str, Any]]:
+    """
+    Top-k lexical matches for `query`.
+    ranking:
+      - "bm25"    : Okapi BM25 over the incremental corpus stats (default)
+      - "jaccard" : the original set-overlap score, kept for comparisons
+    """
+    if ranking not in RANKINGS:
+        raise ValueError(f"Unsupported ranking: {ranking}")
+
+    q_terms = set(_tokenize_simple(query))
+    if not q_terms or k <= 0:
+        return []
+
+    if ranking == "bm25":
+        idf, avgdl = _corpus_idf(q_terms)
+        if not idf:
+            return []
+
+    # bounded heap across all shards instead of sorting every candidate;
+    # entries are (-score, doc_id) so ties fall back to ingest order.
+    # Each shard is only read-locked while it is being scored.
+    top: List[Tuple[float, int]] = []
+    for idx in SHARD_INDEXES:
+        with idx.lock.read():
+            if ranking == "bm25":
+                raw = idx.bm25(idf, avgdl)
+            else:
+                q_size = len(q_terms)
+                raw = {
+                    doc_id: _score(inter, q_size, idx.distinct_terms(doc_id))
+                    for doc_id, inter in idx.overlap(q_terms).items()
+                }
+        top = heapq.nsmallest(
+            k,
+            chain(top, ((-round(s, 3), doc_id) for doc_id, s in raw.items() if s > 0.0)),
+        )
+
+    return [
+        {"text": GLOBAL_REVIEWS.get(doc_id)["text"], "score": -neg}
+        for neg, doc_id in top
+    ]
@@ -1,19 +1,78 @@
 # backend/services/public_data.py
+import queue
+import threading
+import time
 from typing import Iterator, Dict, Any, List
 from core.config import settings, RemoteSource
+from core.logging import get_logger
 from services.remote_stream import stream_remote
 
+log = get_logger("public_data")
+
+# marks "this worker has no more sources" on the merged row queue
+_WORKER_DONE = object()
+
+
 class PublicDataLoader:
     """
     Streams review-like rows from all configured bootstrap sources
     (settings.bootstrap_sources). This is used for cold-start indexing
     without touching Postgres.
+
+    With workers > 1 sources are streamed concurrently (each one blocks on
+    its own network / gzip), merged into one bounded queue, so a cold start
+    takes about as long as the slowest source instead of the sum of them.
+    workers=1 keeps the old one-after-another order.
+    A source that fails is logged, counted and skipped; stats() has per-source
+    rows / skipped / errors / rows-per-second.
     """
 
-    def __init__(self, sources: List[RemoteSource] | None = None, max_items: int = 1000):
+    def __init__(
+        self,
+        sources: List[RemoteSource] | None = None,
+        max_items: int = 1000,
+        workers: int | None = None,
+        queue_size: int | None = None,
+    ):
         # allow override for testing, else pull from settings
         self.sources = sources if sources is not None else settings.bootstrap_sources
         self.max_items = max_items
+        self.workers = max(1, workers or settings.bootstrap_workers)
+        self.queue_size = queue_size or settings.bootstrap_queue_size
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, field: str, n: float = 1):
+        with self._stats_lock:
+            self._stats[name][field] += n
+
+    def _stream_source(self, src: RemoteSource) -> Iterator[Dict[str, Any]]:
+        """
+        Rows of one source. max_items applies per source. Errors are
+        recorded on the source's counters and end that source only.
+        """
+        with self._stats_lock:
+            self._stats[src.name] = {"rows": 0, "skipped": 0, "errors": 0, "seconds": 0.0}
+        t0 = time.perf_counter()
+        try:
+            for row in stream_remote(
+                src.fmt,
+                src.url,
+                domain=src.domain or src.name,
+                max_items=self.max_items,
+            ):
+                if not row.get("text"):
+                    self._count(src.name, "skipped")
+                    continue
+                # enrich with "source" field for later debugging
+                row["source"] = src.name
+                self._count(src.name, "rows")
+                yield row
+        except Exception as e:
+            self._count(src.name, "errors")
+            log.error("Bootstrap source {} ({}) failed: {}", src.name, src.url, e)
+        finally:
+            self._count(src.name, "seconds", time.perf_counter() - t0)
 
     def stream_all(self) -> Iterator[Dict[str, Any]]:
         """
@@ -27,18 +86,81 @@ class PublicDataLoader:
           "domain": ...,
           "source": <source.name>,
         }
+        Rows of one source keep their order; with workers > 1, sources interleave.
         """
+        if self.workers == 1 or len(self.sources) <= 1:
+            for src in self.sources:
+                yield from self._stream_source(src)
+        else:
+            yield from self._stream_concurrent()
+        self._log_stats()
+
+    def _stream_concurrent(self) -> Iterator[Dict[str, Any]]:
+        todo: "queue.Queue[RemoteSource]" = queue.Queue()
         for src in self.sources:
-            # src is RemoteSource(dataclass)
-            # we call stream_remote() with the right fmt/url/domain
-            for row in stream_remote(
-                kind=src.fmt,
-                url=src.url,
-                domain=src.domain or src.name,
-                max_items=self.max_items,
-            ):
-                if not row.get("text"):
+            todo.put(src)
+        out: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            # bounded put that gives up if the consumer went away
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
                     continue
-                # enrich with "source" field for later debugging
-                row["source"] = src.name
-                yield row
+            return False
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    try:
+                        src = todo.get_nowait()
+                    except queue.Empty:
+                        return
+                    for row in self._stream_source(src):
+                        if not put(row):
+                            return
+            finally:
+                put(_WORKER_DONE)
+
+        n_workers = min(self.workers, len(self.sources))
+        threads = [
+            threading.Thread(target=worker, name=f"bootstrap-source-{i}", daemon=True)
+            for i in range(n_workers)
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            running = n_workers
+            while running:
+                item = out.get()
+                if item is _WORKER_DONE:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            # consumer stopped early (or finished): release blocked workers
+            stop.set()
+            for t in threads:
+                t.join(timeout=1.0)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            out = {name: dict(st) for name, st in self._stats.items()}
+        for st in out.values():
+            st["rows_per_s"] = round(st["rows"] / st["seconds"], 1) if st["seconds"] > 0 else 0.0
+            st["seconds"] = round(st["seconds"], 3)
+        return out
+
+    def _log_stats(self):
+        stats = self.stats()
+        for name, st in stats.items():
+            log.info(
+                "Bootstrap source {}: rows={} skipped={} errors={} {}s ({} rows/s)",
+                name, st["rows"], st["skipped"], st["errors"], st["seconds"], st["rows_per_s"],
+            )
+        if stats and all(st["errors"] and not st["rows"] for st in stats.values()):
+            raise RuntimeError("every bootstrap source failed, see log for details")
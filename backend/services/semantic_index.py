@@ -1,13 +1,82 @@
 # services/semantic_index.py
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
-import json
+from threading import Lock, Thread
+import os
+import time
+import uuid
 import numpy as np
 import faiss
 
 from sentence_transformers import SentenceTransformer
 from core.config import settings  # we already saw settings in your config
+from core.logging import get_logger
+from ml.ann_index import add_vectors, ensure_id_mapped, filtered_search, search_params
+from ml.attr_store import AttrIndex, ensure_attrs, normalize_filters
+from ml.index_versions import active_dir, current_version, read_build_state
+from ml.meta_store import MetaStore, MetaStoreWriter, convert_legacy_meta, store_exists
+from ml.query_batcher import QueryBatcher
+from services.state_store import RWLock
+
+log = get_logger("semantic_index")
+
+# serializes checkpoint file writes, so an older snapshot can't be renamed
+# over a newer one
+_CHECKPOINT_LOCK = Lock()
+
+
+class _LoadedVersion:
+    """
+    Everything that belongs to one published index version: FAISS index,
+    metadata store, attribute columns, and the append state for ingest.
+    Swapped as a single reference on reload, so a search that already
+    picked up a version finishes on it.
+    """
+
+    def __init__(self, root: Path):
+        self.version = current_version(root)
+        self.dir = active_dir(root)
+        self.index_path = self.dir / "index.faiss"
+        self.meta_path = self.dir / "meta.jsonl"
+
+        # check files first so a missing index fails fast
+        if not self.index_path.exists():
+            raise RuntimeError(
+                f"FAISS index not found at {self.index_path}. "
+                "You need to ingest/build first."
+            )
+
+        if not store_exists(self.meta_path):
+            legacy = self.dir / "meta.json"
+            if not legacy.exists():
+                raise RuntimeError(
+                    f"Metadata store not found at {self.meta_path}. "
+                    "Cannot map neighbors back to text."
+                )
+            n = convert_legacy_meta(legacy, self.meta_path)
+            log.info("Migrated legacy metadata {} -> {} ({} records)", legacy, self.meta_path, n)
+
+        # mmap the metadata store; records are decoded per hit in search()
+        self.meta = MetaStore(self.meta_path)
+        # domain / source / product / rating columns for filtered search
+        if ensure_attrs(self.meta_path, len(self.meta)):
+            log.info("Backfilled attribute columns for {}", self.meta_path)
+        self.attrs = AttrIndex(self.meta_path)
+
+        # load the faiss index; legacy flat files get an id map so appends
+        # can use explicit ids = metadata record ids
+        self.index = ensure_id_mapped(faiss.read_index(str(self.index_path)))
+        self.rw = RWLock()
+        self.meta_writer: Optional[MetaStoreWriter] = None
+        self.dirty = False
+        # set once a newer version replaced this one; no more appends
+        self.retired = False
+        # ids below build_rows came from the build; the rest were appended by
+        # ingest and get carried over to the next version (SemanticIndex.reload).
+        # Versions without build.json: whatever was there when loaded.
+        self.build = read_build_state(self.dir)
+        self.build_rows = int(self.build.get("rows", self.index.ntotal))
 
 
 class SemanticIndex:
@@ -15,41 +84,49 @@ class SemanticIndex:
     Thin wrapper around FAISS index + metadata so the API can just call search().
     Assumptions:
       - settings.index_dir points to a directory persisted with docker volume (/data/index)
-      - faiss_index_path : index.faiss
-      - faiss_meta_path  : meta.json (list[{"text": "...", ...}, ...] aligned to FAISS ids)
+      - the published version in it (index_dir/current, ml/index_versions.py,
+        or index_dir itself for the pre-versioning layout) holds
+        - index.faiss
+        - meta.jsonl + meta.idx metadata store (ml/meta_store.py),
+          record i = FAISS id i, fetched lazily for the hits only
+    A background watcher (settings.index_reload_interval_s) notices when a
+    new version is published and swaps it in with reload(); in-flight
+    searches finish on the version they started with.
+    New reviews are appended in batches by services/vector_ingest through
+    add_batch(); checkpoint() persists the index. Searches share the read
+    side of an RWLock, adds take the write side. A build only re-reads its
+    sources, so on reload the rows ingest appended to the old version are
+    re-embedded into the new one (_carry_over).
     """
 
     def __init__(self):
         self.index_dir: Path = settings.index_dir
-        self.index_path: Path = settings.faiss_index_path
-        self.meta_path: Path = settings.faiss_meta_path
+
+        # files first so a missing index fails fast, before the model loads
+        self._v = _LoadedVersion(self.index_dir)
+        self._reload_lock = Lock()
 
         # embed model name is in settings.emb_model
         self.model = SentenceTransformer(settings.emb_model)
+        self._check_dim(self._v.index)
 
-        # load FAISS
-        if not self.index_path.exists():
-            raise RuntimeError(
-                f"FAISS index not found at {self.index_path}. "
-                "You need to ingest/build first."
+        # concurrent search() calls are embedded + searched together
+        # (ml/query_batcher.py); None = one encode per query
+        self.batcher: Optional[QueryBatcher] = None
+        if settings.query_batch_enabled:
+            self.batcher = QueryBatcher(
+                self._search_many,
+                max_batch=settings.query_batch_max,
+                max_wait_ms=settings.query_batch_wait_ms,
+                name="semantic-query-batcher",
             )
 
-        if not self.meta_path.exists():
-            raise RuntimeError(
-                f"Metadata file not found at {self.meta_path}. "
-                "Cannot map neighbors back to text."
-            )
-
-        # load metadata rows
-        with open(self.meta_path, "r", encoding="utf-8") as f:
-            self.meta: List[Dict[str, Any]] = json.load(f)
-            # meta[i]["text"] should be the review text string
-
-        # load the faiss index
-        self.index = faiss.read_index(str(self.index_path))
+        if settings.index_reload_interval_s > 0:
+            Thread(target=self._watch, name="semantic-index-watch", daemon=True).start()
 
+    def _check_dim(self, index: faiss.Index):
         # basic safety: make sure dim matches model
-        dim = self.index.d
+        dim = index.d
         test_vec = self.model.encode(["dimension check"], convert_to_numpy=True)
         if test_vec.shape[1] != dim:
             raise RuntimeError(
@@ -57,35 +134,351 @@ class SemanticIndex:
                 "Index was probably built with a different model."
             )
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    # the currently served version's pieces
+    @property
+    def index(self) -> faiss.Index:
+        return self._v.index
+
+    @property
+    def meta(self) -> MetaStore:
+        return self._v.meta
+
+    @property
+    def attrs(self) -> AttrIndex:
+        return self._v.attrs
+
+    @property
+    def index_path(self) -> Path:
+        return self._v.index_path
+
+    @property
+    def meta_path(self) -> Path:
+        return self._v.meta_path
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._v.version
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Swap in the published version if it changed (or force=True).
+        The new version is loaded on the side; searches keep running on the
+        old one until the reference flips. Returns True if it swapped.
+        """
+        with self._reload_lock:
+            old = self._v
+            if not force and current_version(self.index_dir) == old.version:
+                return False
+            new = _LoadedVersion(self.index_dir)
+            self._check_dim(new.index)
+            self._v = new
+            # waits for an add_batch already running on the old version;
+            # later ones see `retired` and go to the new version
+            with old.rw.write():
+                old.retired = True
+                if old.meta_writer is not None:
+                    old.meta_writer.close()
+                    old.meta_writer = None
+            # persist what ingest appended to the old version before leaving it
+            self._checkpoint(old)
+            carried = self._carry_over(old, new)
+        log.info(
+            "Semantic index reloaded {} -> {} ({} vectors, {} ingested rows carried over)",
+            old.version, new.version, new.index.ntotal, carried,
+        )
+        return True
+
+    def _carry_over(self, old: _LoadedVersion, new: _LoadedVersion, chunk: int = 256) -> int:
+        """
+        Re-embed the rows ingest appended to `old` (ids >= its build_rows, or
+        past what an incremental build already copied from it) into `new`,
+        then checkpoint `new`. Without this they'd vanish from search with
+        the old version and be deleted by gc_versions. Only one process per
+        (old, new) pair does it (exclusive marker file in the new version).
+        """
+        start = old.build_rows
+        if new.build.get("base_version") == old.version and old.version is not None:
+            start = max(start, int(new.build.get("base_rows", 0)))
+        old.meta.refresh()
+        end = len(old.meta)
+        if end <= start:
+            return 0
+
+        marker = new.dir / f".carried-from-{old.version or 'legacy'}"
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return 0
+
+        # imported here: index_bootstrap imports this module lazily too
+        from services.index_bootstrap import _canonical_text
+
+        carried = 0
+        for lo in range(start, end, chunk):
+            records = [r for r in old.meta.get_many(range(lo, min(lo + chunk, end))) if r is not None]
+            if not records:
+                continue
+            vecs = self.model.encode(
+                [_canonical_text(r) for r in records],
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            self._append(new, vecs, records)
+            carried += len(records)
+        self._checkpoint(new)
+        return carried
+
+    def _watch(self):
+        while True:
+            time.sleep(settings.index_reload_interval_s)
+            try:
+                self.reload()
+            except Exception as e:
+                log.error("Semantic index reload failed, still serving {}: {}", self.version, e)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        timings: Optional[Dict[str, float]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Returns a list of { "text": <review text>, "score": <similarity> }
         score = cosine similarity 0..1-ish
+        nprobe (IVF) / ef_search (HNSW) trade recall for speed per query and
+        default to settings.index_nprobe / settings.index_ef_search.
+        filters restricts hits to matching records, e.g.
+        {"domain": "health", "source": [...], "product": ..., "min_rating": 4}
+        (ml/attr_store.py); the restriction is applied inside the FAISS
+        search, so up to top_k matching hits still come back.
+        If `timings` is passed, embed_ms / faiss_ms / meta_ms are recorded into
+        it (embed/faiss are for the whole batch the query rode in), plus
+        batch_wait_ms and batch_size when batching is on.
         """
 
         if not query or not query.strip():
             return []
 
-        # embed query -> L2 normalize for cosine sim
-        q_emb = self.model.encode([query], convert_to_numpy=True)  # shape (1, dim)
-        q_norm = q_emb / (np.linalg.norm(q_emb, axis=1, keepdims=True) + 1e-10)
+        req = (
+            query,
+            top_k,
+            nprobe or settings.index_nprobe,
+            ef_search or settings.index_ef_search,
+            tuple(sorted(normalize_filters(filters).items())),
+        )
+        t0 = time.perf_counter()
+        if self.batcher is not None:
+            hits, stage = self.batcher.submit(req)
+            # time spent queued for the batch window / behind the previous batch
+            busy_ms = stage["embed_ms"] + stage["faiss_ms"] + stage["meta_ms"]
+            stage["batch_wait_ms"] = max(0.0, (time.perf_counter() - t0) * 1000.0 - busy_ms)
+        else:
+            hits, stage = self._search_many([req])[0]
 
-        # the FAISS index may be IVF/Flat/etc. We'll just search k=top_k
-        # raw distance from faiss is usually inner product or L2 depending on build.
-        # we assume index was built with IndexFlatIP on normalized vectors.
-        D, I = self.index.search(q_norm.astype(np.float32), top_k)
+        if timings is not None:
+            timings.update(stage)
+        return hits
 
-        # D: (1, top_k) similarity scores, I: (1, top_k) indices into meta
-        hits: List[Dict[str, Any]] = []
-        for rank, (idx, score) in enumerate(zip(I[0], D[0])):
-            if idx < 0 or idx >= len(self.meta):
+    def search_many(
+        self,
+        queries: List[Tuple[str, int, Optional[Dict[str, Any]]]],
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Batch API (/search/batch): (query, top_k, filters) triples -> hits per
+        triple, in order. All queries are embedded in one encode and searched
+        with one index.search per distinct filter, bypassing the micro-batcher
+        (the caller already has the batch). Empty queries get [].
+        """
+        reqs = []
+        positions = []
+        for pos, (query, top_k, filters) in enumerate(queries):
+            if not query or not query.strip():
                 continue
-            text = self.meta[idx].get("text", "")
-            hits.append(
-                {
-                    "text": text,
-                    "score": float(score),
-                }
-            )
+            reqs.append((
+                query,
+                top_k,
+                nprobe or settings.index_nprobe,
+                ef_search or settings.index_ef_search,
+                tuple(sorted(normalize_filters(filters).items())),
+            ))
+            positions.append(pos)
 
-        return hits
+        out: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if reqs:
+            for pos, (hits, _) in zip(positions, self._search_many(reqs)):
+                out[pos] = hits
+        return out
+
+    def _search_many(self, reqs: List[tuple]) -> List[tuple]:
+        """
+        Batched search: one encode for all queries, one index.search per
+        distinct (nprobe, ef_search, filters). reqs are
+        (query, top_k, nprobe, ef_search, filter_items); returns
+        (hits, timings) per request, in order.
+        """
+        t0 = time.perf_counter()
+
+        # embed queries -> L2 normalize for cosine sim
+        q_emb = self.model.encode([r[0] for r in reqs], convert_to_numpy=True)  # (n, dim)
+        q_norm = q_emb / (np.linalg.norm(q_emb, axis=1, keepdims=True) + 1e-10)
+        q_norm = q_norm.astype(np.float32)
+        t1 = time.perf_counter()
+
+        groups: Dict[tuple, List[int]] = {}
+        for pos, (_, _, nprobe, ef_search, filter_items) in enumerate(reqs):
+            groups.setdefault((nprobe, ef_search, filter_items), []).append(pos)
+
+        out: List[Any] = [None] * len(reqs)
+        faiss_s = 0.0
+        v = self._v
+        with v.rw.read():
+            for (nprobe, ef_search, filter_items), rows in groups.items():
+                ts = time.perf_counter()
+                k = max(reqs[pos][1] for pos in rows)
+                # the FAISS index may be Flat/IVF/HNSW or fp16/sq8/IVF-PQ compressed
+                # (ml/ann_index.py), always inner product on normalized vectors;
+                # faiss.read_index restored whichever it was.
+                if filter_items:
+                    # id bitmap over the attribute columns -> IDSelector, with
+                    # retries so a narrow filter still fills k (filtered_search)
+                    bitmap, _, n_match = v.attrs.bitmap(dict(filter_items))
+                    if n_match == 0:
+                        for pos in rows:
+                            out[pos] = ([], {"meta_ms": 0.0})
+                        continue
+                    D, I = filtered_search(
+                        v.index, q_norm[rows], k, bitmap, n_match, nprobe=nprobe, ef_search=ef_search
+                    )
+                else:
+                    params = search_params(v.index, nprobe=nprobe, ef_search=ef_search)
+                    D, I = v.index.search(q_norm[rows], k, params=params)
+                faiss_s += time.perf_counter() - ts
+
+                # D: (n, k) similarity scores, I: (n, k) ids into meta
+                for j, pos in enumerate(rows):
+                    tm = time.perf_counter()
+                    hits: List[Dict[str, Any]] = []
+                    top_k = reqs[pos][1]
+                    for idx, score in zip(I[j][:top_k], D[j][:top_k]):
+                        if idx < 0:
+                            # fewer than k matches
+                            break
+                        row = v.meta.get(int(idx))
+                        if row is None:
+                            continue
+                        hits.append(
+                            {
+                                "text": row.get("text", ""),
+                                "score": float(score),
+                            }
+                        )
+                    out[pos] = (hits, {"meta_ms": (time.perf_counter() - tm) * 1000.0})
+
+        embed_ms = (t1 - t0) * 1000.0
+        for _, stage in out:
+            stage["embed_ms"] = embed_ms
+            stage["faiss_ms"] = faiss_s * 1000.0
+            stage["batch_size"] = len(reqs)
+        return out
+
+    def add_batch(self, vecs: np.ndarray, records: List[Dict[str, Any]]) -> List[int]:
+        """
+        Append L2-normalized vectors + their metadata records (same order).
+        Returns the FAISS ids they got. Searchable as soon as this returns;
+        on disk after the next checkpoint().
+        """
+        if len(vecs) != len(records):
+            raise ValueError("vectors and records must line up")
+        while True:
+            first_id = self._append(self._v, vecs, records)
+            # None: swapped out by reload() while we waited for the lock
+            if first_id is not None:
+                return list(range(first_id, first_id + len(records)))
+
+    @staticmethod
+    def _append(v: _LoadedVersion, vecs: np.ndarray, records: List[Dict[str, Any]]) -> Optional[int]:
+        with v.rw.write():
+            if v.retired:
+                return None
+            if v.meta_writer is None:
+                v.meta_writer = MetaStoreWriter(v.meta_path, mode="a")
+            first_id = len(v.meta_writer)
+            add_vectors(v.index, vecs, first_id)
+            v.meta_writer.extend(records)
+            v.meta_writer.flush()
+            v.meta.refresh()
+            v.attrs.refresh()
+            v.dirty = True
+        return first_id
+
+    def checkpoint(self) -> bool:
+        """
+        Write the in-memory index over index.faiss of the served version
+        (temp file + rename, so readers of the file never see a partial
+        write). Metadata is already flushed by add_batch. Returns False if
+        there was nothing to write.
+        When a newer build is published, reload() re-embeds the rows
+        appended here into it (_carry_over).
+        """
+        return self._checkpoint(self._v)
+
+    @staticmethod
+    def _checkpoint(v: _LoadedVersion) -> bool:
+        # the read lock is held only for the in-memory copy: the RWLock
+        # prefers writers, so a slow disk write under it would stall searches
+        # behind the next add_batch
+        with v.rw.read():
+            if not v.dirty:
+                return False
+            buf = faiss.serialize_index(v.index)
+            v.dirty = False
+        # ingest thread and reload() may both checkpoint the same version
+        tmp = v.index_path.with_name(f"index.faiss.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with _CHECKPOINT_LOCK:
+                with open(tmp, "wb") as f:
+                    f.write(buf.tobytes())
+                os.replace(tmp, v.index_path)
+        except BaseException:
+            v.dirty = True
+            tmp.unlink(missing_ok=True)
+            raise
+        return True
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+
+# process-wide singleton: the SentenceTransformer + FAISS file load once,
+# on first use, not per request
+_SEMANTIC_INDEX: Optional[SemanticIndex] = None
+_SEMANTIC_LOCK = Lock()
+
+
+def reload_if_loaded() -> bool:
+    """
+    Called after publishing a build in this process, so the new version is
+    served right away instead of at the next watcher tick.
+    """
+    if _SEMANTIC_INDEX is None:
+        return False
+    return _SEMANTIC_INDEX.reload()
+
+
+def get_semantic_index() -> SemanticIndex:
+    """
+    Lazily build the shared SemanticIndex. Raises RuntimeError if the index
+    files are missing (nothing is cached, so a later build is picked up).
+    """
+    global _SEMANTIC_INDEX
+    if _SEMANTIC_INDEX is None:
+        with _SEMANTIC_LOCK:
+            if _SEMANTIC_INDEX is None:
+                _SEMANTIC_INDEX = SemanticIndex()
+    return _SEMANTIC_INDEX
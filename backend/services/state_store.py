@@ -1,11 +1,328 @@
 # backend/services/state_store.py
 
-from typing import List, Dict, Any
-from threading import Lock
+import json
+import mmap
+import os
+import sys
+from collections import deque
+from contextlib import contextmanager
+from itertools import count
+from pathlib import Path
+from typing import Dict, Any, Deque, Iterator, Optional, Tuple
+from threading import Condition, Lock
 
-# Pretend "database" of raw reviews we've seen (strings)
-GLOBAL_REVIEWS: List[Dict[str, Any]] = []
-REVIEWS_LOCK = Lock()
+from core.config import settings
+from core.logging import get_logger
+
+log = get_logger("state_store")
+
+
+class RWLock:
+    """
+    Readers-writer lock: any number of readers at once, writers exclusive.
+    Writer-preferring, so a steady stream of searches can't starve ingest.
+    """
+
+    def __init__(self):
+        self._cond = Condition(Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class _SegmentFile:
+    """
+    Append-only on-disk segment of spilled review rows (one JSON record per
+    write). Reads go through an mmap of the file, remapped when it grows.
+    The file is unlinked as soon as it's open: the open fd (and mmap) keep it
+    readable, and the kernel frees the space when the process exits, however
+    it exits.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # the store is in-memory per process, so start every run with a fresh segment
+        self.path = path
+        self._f = open(path, "w+b")
+        try:
+            path.unlink()
+        except OSError:
+            # e.g. Windows won't unlink an open file; it's truncated on next start
+            pass
+        self._size = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._mm_lock = Lock()
+
+    def append(self, payload: bytes) -> int:
+        # callers serialize appends (ShardedReviewStore._spill_lock)
+        offset = self._size
+        self._f.write(payload)
+        self._f.flush()
+        self._size += len(payload)
+        return offset
+
+    def read(self, offset: int, length: int) -> bytes:
+        with self._mm_lock:
+            if self._mm is None or offset + length > len(self._mm):
+                if self._mm is not None:
+                    self._mm.close()
+                self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mm[offset:offset + length]
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+def _remove_stale_segments(spill_dir: Path) -> None:
+    # segments left on disk by processes that are gone (crashed before the
+    # unlink, or ran a build that didn't unlink). POSIX only: on Windows
+    # os.kill(pid, 0) would terminate the process.
+    if os.name != "posix":
+        return
+    for seg in spill_dir.glob("reviews.*.seg"):
+        try:
+            pid = int(seg.name.split(".")[1])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        try:
+            os.kill(pid, 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except OSError:
+            # alive but owned by someone else
+            continue
+        try:
+            seg.unlink()
+        except OSError:
+            pass
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    # rough resident cost of a row dict and its values
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+
+class _ReviewShard:
+    def __init__(self):
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        # doc_id -> (offset, length) in the spill segment
+        self.spilled: Dict[int, Tuple[int, int]] = {}
+        self.lock = RWLock()
+
+
+class ShardedReviewStore:
+    """
+    Pretend "database" of raw reviews we've seen, split into shards so
+    writers only lock 1/n_shards of the data and readers never wait on
+    each other.
+
+    doc ids are global, increasing in ingest order; doc_id % n_shards
+    picks the shard. Callers that keep their own per-doc structures
+    (e.g. the lexical search index) can shard them the same way via
+    shard_of().
+
+    Resident memory is capped at max_bytes (0 = unbounded): the row dicts
+    plus the in-memory index state callers build over them, which they
+    report through add_index_bytes(). Past the budget the oldest rows are
+    spilled to an append-only segment file under
+    spill_dir (reviews.<pid>.seg, one per process, unlinked once open) and
+    read back through
+    mmap'd offsets, so get() / iter_rows() keep working for every doc id.
+    Index state itself stays resident, so once every row is spilled the
+    index alone can still exceed the budget; stats() shows both parts.
+    """
+
+    def __init__(self, n_shards: int = 16, max_bytes: int = 0, spill_dir: Optional[Path] = None):
+        self.n_shards = n_shards
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._shards = [_ReviewShard() for _ in range(n_shards)]
+        self._ids = count()
+        self._id_lock = Lock()
+        self._size = 0
+
+        # resident rows in ingest order -> eviction order
+        self._resident: Deque[Tuple[int, int]] = deque()
+        self._resident_bytes = 0
+        self._index_bytes = 0
+        self._index_over_warned = False
+        self._spill_lock = Lock()
+        self._segment: Optional[_SegmentFile] = None
+        self._spill_failed = False
+
+    def shard_of(self, doc_id: int) -> int:
+        return doc_id % self.n_shards
+
+    def append(self, row: Dict[str, Any]) -> int:
+        """
+        Store a review row and return its doc id.
+        """
+        nbytes = _row_bytes(row)
+        with self._id_lock:
+            doc_id = next(self._ids)
+        shard = self._shards[self.shard_of(doc_id)]
+        with shard.lock.write():
+            shard.rows[doc_id] = row
+        with self._id_lock:
+            self._size += 1
+            self._resident.append((doc_id, nbytes))
+            self._resident_bytes += nbytes
+            over_budget = self._over_budget()
+        if over_budget:
+            self._spill_oldest()
+        return doc_id
+
+    def add_index_bytes(self, nbytes: int) -> None:
+        """
+        Count `nbytes` of resident per-doc index state (e.g. the lexical
+        search postings) against max_bytes, spilling rows to make room.
+        """
+        with self._id_lock:
+            self._index_bytes += nbytes
+            over_budget = self._over_budget()
+            warn = over_budget and self._index_bytes > self.max_bytes and not self._index_over_warned
+            if warn:
+                self._index_over_warned = True
+        if warn:
+            log.warning(
+                "review index state ({} bytes) alone exceeds review_store_max_bytes ({})",
+                self._index_bytes, self.max_bytes,
+            )
+        if over_budget:
+            self._spill_oldest()
+
+    def _over_budget(self) -> bool:
+        # caller holds _id_lock
+        return bool(self.max_bytes) and self._resident_bytes + self._index_bytes > self.max_bytes
+
+    def _open_segment(self) -> Optional[_SegmentFile]:
+        if self._segment is None and not self._spill_failed:
+            try:
+                # one segment per process: uvicorn --workers N share spill_dir,
+                # and each opens its segment "w+b"
+                _remove_stale_segments(self.spill_dir)
+                self._segment = _SegmentFile(self.spill_dir / f"reviews.{os.getpid()}.seg")
+            except (OSError, TypeError) as e:
+                # no writable spill dir -> degrade to unbounded RAM rather than fail ingest
+                log.warning("review spill disabled ({}), keeping all rows in RAM", e)
+                self._spill_failed = True
+        return self._segment
+
+    def _spill_oldest(self):
+        # one spiller at a time; anyone else arriving over budget just carries on
+        if not self._spill_lock.acquire(blocking=False):
+            return
+        try:
+            segment = self._open_segment()
+            if segment is None:
+                return
+            while True:
+                with self._id_lock:
+                    if not self._resident or not self._over_budget():
+                        return
+                    doc_id, nbytes = self._resident.popleft()
+                    self._resident_bytes -= nbytes
+
+                shard = self._shards[self.shard_of(doc_id)]
+                with shard.lock.read():
+                    row = shard.rows.get(doc_id)
+                if row is None:
+                    continue
+                payload = json.dumps(row, ensure_ascii=False).encode("utf-8")
+                offset = segment.append(payload)
+                with shard.lock.write():
+                    shard.spilled[doc_id] = (offset, len(payload))
+                    del shard.rows[doc_id]
+        finally:
+            self._spill_lock.release()
+
+    def _read_spilled(self, loc: Tuple[int, int]) -> Dict[str, Any]:
+        offset, length = loc
+        return json.loads(self._segment.read(offset, length).decode("utf-8"))
+
+    def get(self, doc_id: int) -> Optional[Dict[str, Any]]:
+        shard = self._shards[self.shard_of(doc_id)]
+        with shard.lock.read():
+            row = shard.rows.get(doc_id)
+            loc = shard.spilled.get(doc_id) if row is None else None
+        if loc is not None:
+            return self._read_spilled(loc)
+        return row
+
+    def iter_rows(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yields (doc_id, row) shard by shard. Each shard is snapshotted under
+        its read lock, so iteration never holds a lock while the caller works.
+        Spilled rows are read back from the segment file.
+        """
+        for shard in self._shards:
+            with shard.lock.read():
+                snapshot = list(shard.rows.items())
+                spilled = list(shard.spilled.items())
+            yield from snapshot
+            for doc_id, loc in spilled:
+                yield doc_id, self._read_spilled(loc)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._id_lock:
+            resident_docs = len(self._resident)
+            row_bytes = self._resident_bytes
+            index_bytes = self._index_bytes
+            total = self._size
+        segment = self._segment
+        return {
+            "docs": total,
+            "resident_docs": resident_docs,
+            # rows + index state, what counts against max_bytes
+            "resident_bytes": row_bytes + index_bytes,
+            "resident_row_bytes": row_bytes,
+            "index_bytes": index_bytes,
+            "spilled_docs": total - resident_docs,
+            "spilled_bytes": segment.size if segment is not None else 0,
+            "max_bytes": self.max_bytes,
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+
+GLOBAL_REVIEWS = ShardedReviewStore(
+    max_bytes=settings.review_store_max_bytes,
+    spill_dir=settings.review_store_spill_dir,
+)
 
 # Pretend "aspect analytics table"
 # aspect -> { "count": int, "total_sent": float }
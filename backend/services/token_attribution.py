@@ -0,0 +1,102 @@
+# backend/services/token_attribution.py
+import time
+from typing import Any, Dict, List, Optional
+
+ATTRIBUTION_MODES = ("lexicon", "token", "occlusion")
+# full text + this many occluded variants per forward pass
+DEFAULT_BATCH_SIZE = 32
+# model modes never run more passes than this: occlusion occludes spans,
+# token mode falls back to the lexicon for the remaining distinct tokens
+DEFAULT_MAX_PASSES = 4
+
+
+def _continuous(pred: Dict[str, Any]) -> float:
+    # same mapping as explain_model._continuous_sentiment, kept local so the
+    # lexicon mode never imports the model stack
+    label = (pred.get("label") or "").lower()
+    score = max(0.0, min(1.0, float(pred.get("score", 0.0))))
+    if "pos" in label:
+        return score
+    if "neg" in label:
+        return -score
+    return 0.0
+
+
+def _clamp(x: float) -> float:
+    return max(-1.0, min(1.0, x))
+
+
+def _occlusion(tokens: List[str], batch_size: int, max_passes: int, cost: Dict[str, Any]) -> List[float]:
+    """
+    score(token) = sentiment(text) - sentiment(text without it).
+    With more tokens than fit in max_passes batches, contiguous spans are
+    occluded together and every token of a span gets the span's score.
+    """
+    from ml.sentiment_model import predict_sentiment_many
+
+    budget = max(1, max_passes * batch_size - 1)
+    span = -(-len(tokens) // budget)
+    starts = list(range(0, len(tokens), span))
+    variants = [" ".join(tokens[:s] + tokens[s + span:]) for s in starts]
+    preds = predict_sentiment_many([" ".join(tokens)] + variants, batch_size=batch_size, stats=cost)
+
+    full = _continuous(preds[0])
+    scores: List[float] = []
+    for s, pred in zip(starts, preds[1:]):
+        delta = _clamp(full - _continuous(pred))
+        scores.extend([delta] * len(tokens[s:s + span]))
+    cost["span"] = span
+    return scores
+
+
+def _per_token(tokens: List[str], batch_size: int, max_passes: int, cost: Dict[str, Any]) -> List[float]:
+    from ml.sentiment_model import predict_sentiment_many
+    from services.lightweight_explain import lexicon_score
+
+    distinct = list(dict.fromkeys(tokens))
+    scored = distinct[:max(1, max_passes) * batch_size]
+    preds = predict_sentiment_many(scored, batch_size=batch_size, stats=cost)
+    by_token = {t: _clamp(_continuous(p)) for t, p in zip(scored, preds)}
+    cost["lexicon_tokens"] = len(distinct) - len(scored)
+    return [by_token[t] if t in by_token else lexicon_score(t) for t in tokens]
+
+
+def attribute_tokens(
+    tokens: List[str],
+    mode: str = "occlusion",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_passes: int = DEFAULT_MAX_PASSES,
+    cost: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Per-token sentiment attributions, [{"token", "score" in [-1, 1]}, ...].
+    mode:
+      - "lexicon"   : POS/NEG word list (services.lightweight_explain), no model
+      - "token"     : sentiment of each token on its own; distinct tokens are
+                      scored in padded batches, at most max_passes of them;
+                      distinct tokens past max_passes * batch_size fall back
+                      to their lexicon score (cost["lexicon_tokens"])
+      - "occlusion" : how much dropping the token moves the text's sentiment;
+                      text + variants in at most max_passes batched passes
+    If given, `cost` is filled with mode / tokens / sequences scored /
+    forward_passes / ms for the request. Raises ValueError on unknown modes.
+    """
+    if mode not in ATTRIBUTION_MODES:
+        raise ValueError(f"Unsupported attribution mode: {mode}")
+    if cost is None:
+        cost = {}
+    cost.update({"mode": mode, "tokens": len(tokens), "sequences": 0, "forward_passes": 0})
+    t0 = time.perf_counter()
+
+    if not tokens:
+        scores: List[float] = []
+    elif mode == "lexicon":
+        from services.lightweight_explain import lexicon_score
+        scores = [lexicon_score(t) for t in tokens]
+    elif mode == "token":
+        scores = _per_token(tokens, batch_size, max_passes, cost)
+    else:
+        scores = _occlusion(tokens, batch_size, max_passes, cost)
+
+    cost["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return [{"token": t, "score": float(s)} for t, s in zip(tokens, scores)]
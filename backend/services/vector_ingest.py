@@ -0,0 +1,209 @@
+# backend/services/vector_ingest.py
+import importlib.util
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from core.config import settings
+from core.logging import get_logger
+
+log = get_logger("vector_ingest")
+
+
+class VectorIngestor:
+    """
+    Background embedder that keeps the FAISS index in step with ingest.
+
+    /ingest/jsonl and /explain-request only enqueue() the review text (cheap,
+    never blocks). A daemon thread drains the queue in batches of up to
+    `batch_size` texts (or whatever arrived within `max_wait_s`), embeds them
+    in one forward pass, appends them to the shared SemanticIndex + metadata
+    store, and checkpoints the index to disk every `checkpoint_every_s`.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 64,
+        max_wait_s: float = 0.5,
+        checkpoint_every_s: float = 30.0,
+        max_queue: int = 10000,
+    ):
+        self.batch_size = batch_size
+        self.max_wait_s = max_wait_s
+        self.checkpoint_every_s = checkpoint_every_s
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._last_checkpoint = time.monotonic()
+
+        # bumped from request threads (enqueue) and the worker
+        self._counters_lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "indexed": 0,
+            "dropped": 0,
+            "batches": 0,
+            "checkpoints": 0,
+            "errors": 0,
+        }
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="vector-ingest", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Drain what's queued, checkpoint, and stop the worker.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def enqueue(self, text: str, record: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Queue one review for embedding. `record` is the metadata stored with
+        it (defaults to {"text": text, "source": "ingest"}). Returns False if
+        the queue is full and the review was dropped.
+        """
+        self.start()
+        # copy: the worker reads it later, the caller may keep using `record`
+        item = dict(record) if record else {"text": text, "source": "ingest"}
+        item.setdefault("text", text)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count(dropped=1)
+            return False
+        self._count(enqueued=1)
+        return True
+
+    def _count(self, **deltas: int) -> None:
+        with self._counters_lock:
+            for name, n in deltas.items():
+                self._counters[name] += n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            out: Dict[str, Any] = dict(self._counters)
+        out["queue_depth"] = self._queue.qsize()
+        out["running"] = self._thread is not None and self._thread.is_alive()
+        return out
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        try:
+            first = self._queue.get(timeout=self.max_wait_s)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _index_batch(self, batch: List[Dict[str, Any]]):
+        # heavy deps imported here so route modules stay importable without faiss
+        from services.index_bootstrap import _canonical_text
+        from services.semantic_index import get_semantic_index
+
+        sem = get_semantic_index()
+        texts = [_canonical_text(r) for r in batch]
+        vecs = sem.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        sem.add_batch(vecs, batch)
+        self._count(indexed=len(batch), batches=1)
+        return sem
+
+    def _run(self):
+        sem = None
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    sem = self._index_batch(batch)
+                except Exception as e:
+                    self._count(errors=1, dropped=len(batch))
+                    log.error("vector ingest batch of {} failed: {}", len(batch), e)
+
+            stopping = self._stop.is_set() and self._queue.empty()
+            due = time.monotonic() - self._last_checkpoint >= self.checkpoint_every_s
+            if sem is not None and (due or stopping):
+                try:
+                    if sem.checkpoint():
+                        self._count(checkpoints=1)
+                except Exception as e:
+                    self._count(errors=1)
+                    log.error("vector index checkpoint failed: {}", e)
+                self._last_checkpoint = time.monotonic()
+            if stopping:
+                return
+
+
+_INGESTOR: Optional[VectorIngestor] = None
+_INGESTOR_LOCK = threading.Lock()
+
+
+def get_vector_ingestor() -> VectorIngestor:
+    global _INGESTOR
+    if _INGESTOR is None:
+        with _INGESTOR_LOCK:
+            if _INGESTOR is None:
+                _INGESTOR = VectorIngestor(
+                    batch_size=settings.vector_ingest_batch_size,
+                    max_wait_s=settings.vector_ingest_max_wait_ms / 1000.0,
+                    checkpoint_every_s=settings.vector_ingest_checkpoint_s,
+                    max_queue=settings.vector_ingest_queue_max,
+                )
+    return _INGESTOR
+
+
+_STACK_AVAILABLE: Optional[bool] = None
+
+
+def vector_ingest_available() -> bool:
+    """
+    settings.vector_ingest_enabled, and the FAISS stack is installed. The
+    lite image (requirements-lite.txt) ships without faiss /
+    sentence-transformers; there every batch would fail, so ingest skips
+    the embedder instead.
+    """
+    global _STACK_AVAILABLE
+    if not settings.vector_ingest_enabled:
+        return False
+    if _STACK_AVAILABLE is None:
+        missing = [m for m in ("faiss", "sentence_transformers") if importlib.util.find_spec(m) is None]
+        _STACK_AVAILABLE = not missing
+        if missing:
+            log.info("vector ingest disabled: {} not installed", ", ".join(missing))
+    return _STACK_AVAILABLE
+
+
+def enqueue_for_indexing(text: str) -> bool:
+    """
+    Ingest-path hook: make `text` semantically searchable in the background.
+    No-op when vector ingest is disabled or unavailable (vector_ingest_available()).
+    """
+    if not vector_ingest_available():
+        return False
+    return get_vector_ingestor().enqueue(text)
+
+
+def shutdown_vector_ingest():
+    if _INGESTOR is not None:
+        _INGESTOR.stop()